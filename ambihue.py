@@ -13,7 +13,11 @@ from typing import Any
 import yaml
 
 from src.ah_logger import init_logger
-from src.main import AmbiHueMain, discover_hue, verify_hue, verify_tv
+from src.benchmark import run_benchmark
+from src.config_loader import ConfigLoader
+from src.config_watcher import ConfigWatcher
+from src.main import AmbiHueMain, MultiRoomMain, discover_hue, verify_hue, verify_tv
+from src.recording import RecordingWriter
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +25,9 @@ logger = logging.getLogger(__name__)
 def _signal_handler(sig: Any, frame: Any) -> None:
     """Signal handler to handle Ctrl+C to gracefully exit app.
 
+    SystemExit unwinds the frame loop, which stops the TV reader process of the multiprocess mode
+    and removes its shared memory. The reader process ignores Ctrl+C itself.
+
     Args:
         sig (Any): signal
         frame (Any): frame
@@ -31,8 +38,9 @@ def _signal_handler(sig: Any, frame: Any) -> None:
     sys.exit(0)
 
 
-# Register signal handler.
+# Register signal handler. SIGTERM is sent by `docker stop` and Home Assistant.
 signal.signal(signal.SIGINT, _signal_handler)
+signal.signal(signal.SIGTERM, _signal_handler)
 
 
 def _init_parser() -> Any:
@@ -49,12 +57,62 @@ def _init_parser() -> Any:
         default=False,
         help="Detect Hue Entertainment configuration.",
     )
+    parser.add_argument(
+        "--benchmark",
+        type=float,
+        metavar="SECONDS",
+        help="Benchmark the hot loop with a local fake TV and fake Hue for given time.",
+    )
+    parser.add_argument(
+        "--benchmark_latency_ms",
+        type=float,
+        default=55,
+        help="Benchmark: fake TV response time.",
+    )
+    parser.add_argument(
+        "--benchmark_jitter_ms",
+        type=float,
+        default=15,
+        help="Benchmark: fake TV response time jitter (+-).",
+    )
+    parser.add_argument(
+        "--benchmark_data",
+        help="Benchmark: file with recorded TV responses, one JSON per line.",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="Record decoded TV frames to a binary file while running.",
+    )
+    parser.add_argument(
+        "--record_zstd",
+        action="store_true",
+        default=False,
+        help="Record: compress frames with zstd (pip install zstandard).",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="Send frames of a recording to Hue instead of reading the TV.",
+    )
+    parser.add_argument(
+        "--replay_speed",
+        type=float,
+        default=1.0,
+        help="Replay: 1.0 = original timing, 2.0 = twice as fast, 0 = as fast as possible.",
+    )
     parser.add_argument(
         "--loglevel",
         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
         default="WARNING",  # Default log level
         help="Set the log level for the logger.",
     )
+    parser.add_argument(
+        "--log_sync",
+        action="store_true",
+        default=False,
+        help="Write log messages in the logging thread instead of a background writer thread.",
+    )
 
     try:
         import argcomplete  # pylint: disable=import-outside-toplevel
@@ -70,19 +128,26 @@ def _init_parser() -> Any:
 _HOME_ASSISTANT_CONFIG = "/data/options.json"
 
 
+def _copy_ha_options() -> None:
+    with open(_HOME_ASSISTANT_CONFIG, encoding="utf-8") as ha_config_file:
+        user_config_dict = json.load(ha_config_file)
+
+    # replaced at once, the config watcher never reads a half written file
+    with open("userconfig.yaml.tmp", "w", encoding="utf-8") as out:
+        yaml.dump(user_config_dict, out, default_flow_style=False)
+    os.replace("userconfig.yaml.tmp", "userconfig.yaml")
+
+
 def _create_user_config() -> None:
     if os.path.exists("userconfig.yaml"):
         return  # already exists
 
     # Try to load the user config from Home Assistant
     if os.path.exists(_HOME_ASSISTANT_CONFIG):
-        with open(_HOME_ASSISTANT_CONFIG, encoding="utf-8") as ha_config_file:
-
-            user_config_dict = json.load(ha_config_file)
-
-            with open("userconfig.yaml", "w", encoding="utf-8") as out:
-                yaml.dump(user_config_dict, out, default_flow_style=False)
-            return
+        _copy_ha_options()
+        # options saved in Home Assistant update userconfig.yaml, running app reloads it
+        ConfigWatcher(_HOME_ASSISTANT_CONFIG, _copy_ha_options).start()
+        return
 
     raise FileNotFoundError(("userconfig.yaml NOT FOUND"))
 
@@ -91,7 +156,17 @@ def main() -> None:
     """Main function to run the spawn AmbiHue. Enable logs and parse input."""
     args = _init_parser()
 
-    init_logger(args.loglevel)
+    init_logger(args.loglevel, use_queue=not args.log_sync)
+
+    if args.benchmark:
+        # uses userconfig.yaml light setup if available
+        run_benchmark(
+            args.benchmark,
+            args.benchmark_latency_ms,
+            args.benchmark_jitter_ms,
+            args.benchmark_data,
+        )
+        return
 
     _create_user_config()
 
@@ -105,7 +180,17 @@ def main() -> None:
         discover_hue()
         return
 
-    AmbiHueMain().run()
+    if ConfigLoader().get_rooms() and not (args.replay or args.record):
+        MultiRoomMain().run()
+        return
+
+    app = AmbiHueMain()
+    if args.replay:
+        app.replay(args.replay, args.replay_speed)
+        return
+    if args.record:
+        app.recorder = RecordingWriter(args.record, compress=args.record_zstd)
+    app.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Run the hot loop benchmark for the main pipeline variants and print a summary table.
+
+Usage (from repository root):
+    python3 benchmarks/run_suite.py [--duration 10] [--data recorded.jsonl]
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable-next=wrong-import-position
+from src.benchmark import BENCHMARK_CONFIG, run_benchmark  # noqa: E402
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "sequential": {},
+    "pipelined": {"pipeline": {"mode": "pipelined", "hue_rate_hz": 50}},
+    "pipelined_3_in_flight": {
+        "pipeline": {"mode": "pipelined", "hue_rate_hz": 50},
+        "ambilight_tv": {"in_flight_requests": 3, "stagger_ms": 20},
+    },
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario.")
+    parser.add_argument("--latency_ms", type=float, default=55, help="Fake TV response time.")
+    parser.add_argument("--jitter_ms", type=float, default=15, help="Fake TV jitter (+-).")
+    parser.add_argument("--data", help="Recorded TV responses, one JSON per line.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, scenario in SCENARIOS.items():
+            config = {
+                "ambilight_tv": {"ip": "127.0.0.1", **scenario.get("ambilight_tv", {})},
+                "hue_entertainment_group": {"index": 0},
+                "lights_setup": BENCHMARK_CONFIG["lights_setup"],
+                "pipeline": scenario.get("pipeline", {}),
+            }
+            config_path = Path(tmp_dir) / f"{name}.yaml"
+            config_path.write_text(yaml.dump(config), encoding="utf-8")
+
+            print(f"\n=== {name} ===")
+            results[name] = run_benchmark(
+                args.duration, args.latency_ms, args.jitter_ms, args.data, config_path
+            )
+
+    keys = ["frames_per_s", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms"]
+    print("\n" + f"{'scenario':<24}" + "".join(f"{key:>16}" for key in keys))
+    for name, report in results.items():
+        print(f"{name:<24}" + "".join(f"{report[key]:>16.2f}" for key in keys))
+
+
+if __name__ == "__main__":
+    main()
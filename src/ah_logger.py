@@ -1,8 +1,19 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.colors import Color
 
 
 class ColoredFormatter(logging.Formatter):
-    """Custom formatter to add colors to log messages based on severity level."""
+    """Custom formatter to add colors to log messages based on severity level.
+
+    Colored level and module names and the time of the current second are cached, records are
+    left as they are.
+    """
 
     # Define color codes for different log levels
     COLORS = {
@@ -14,18 +25,43 @@ class ColoredFormatter(logging.Formatter):
     }
     RESET = "\033[0m"  # Reset color
 
-    def format(self, record: logging.LogRecord) -> str:
-        # Add color to the log level name
-        lvl_color = self.COLORS.get(record.levelname, self.RESET)
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._names: Dict[Tuple[str, str], Tuple[str, str]] = {}  # colored level and module
+        self._time: Tuple[int, str] = (-1, "")  # second and its formatted time
 
-        record.levelname = lvl_color + record.levelname + self.RESET
+    def _colored(self, levelname: str, module: str) -> Tuple[str, str]:
+        names = self._names.get((levelname, module))
+        if names is None:
+            lvl_color = self.COLORS.get(levelname, self.RESET)
+            names = self._names[(levelname, module)] = (
+                lvl_color + levelname + self.RESET,
+                lvl_color + module[:18].center(18) + self.RESET,
+            )
+        return names
 
-        record.module = lvl_color + record.module[:18].center(18) + self.RESET
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        second = int(record.created)
+        if second != self._time[0]:
+            self._time = (second, super().formatTime(record, datefmt))
+        return self._time[1]
+
+    def format(self, record: logging.LogRecord) -> str:
+        # Add color to the log level name, restored afterwards for other handlers
+        levelname, module = record.levelname, record.module
+        record.levelname, record.module = self._colored(levelname, module)
+        try:
+            return super().format(record)
+        finally:
+            record.levelname, record.module = levelname, module
 
-        return super().format(record)
 
+def init_logger(loglevel: str, use_queue: bool = True) -> None:
+    """Log to stderr with colors.
 
-def init_logger(loglevel: str) -> None:
+    With `use_queue` the calling thread only puts records into a queue, a listener thread
+    formats and writes them, so a slow console or Docker log driver never blocks the frame loop.
+    """
     # Define a custom format including milliseconds
     log_format = "%(asctime)s.%(msecs)03d %(levelname)17s %(module)20s - %(message)s"
     date_format = "%H:%M:%S"
@@ -37,7 +73,14 @@ def init_logger(loglevel: str) -> None:
     # Configure the logger
     logger = logging.getLogger()
     logger.setLevel(loglevel)  # Set the logging level to DEBUG
-    logger.addHandler(handler)
+    if use_queue:
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)  # queued records are written before exit
+        logger.addHandler(logging.handlers.QueueHandler(records))
+    else:
+        logger.addHandler(handler)
 
     # Print all types of messages
     if loglevel == "DEBUG":
@@ -46,3 +89,58 @@ def init_logger(loglevel: str) -> None:
         logger.warning("This is a warning message.")
         logger.error("This is an error message.")
         logger.critical("This is a critical message.")
+
+
+class ColorSummary:
+    """Light colors averaged over `interval_s`, logged as one line instead of a line per frame.
+
+    Lights not updated in a frame count with their last color.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, names: Sequence[str], interval_s: float = 1.0
+    ) -> None:
+        self._logger = logger
+        self._names = list(names)
+        self._interval_s = interval_s
+        self._sums = [0] * (3 * len(self._names))  # r, g, b sums of every light
+        self._last: List[Optional[Tuple[int, int, int]]] = [None] * len(self._names)
+        self._frames = 0
+        self._started = time.monotonic()
+
+    def add(self, colors: Sequence[Optional[Tuple[int, int, int]]]) -> None:
+        """Add colors of a frame, log the summary when the interval is over."""
+        sums, last = self._sums, self._last
+        for idx in range(len(last)):  # pylint: disable=consider-using-enumerate
+            color = colors[idx]
+            if color is None:
+                color = last[idx]
+                if color is None:
+                    continue
+            else:
+                last[idx] = color
+            sums[3 * idx] += color[0]
+            sums[3 * idx + 1] += color[1]
+            sums[3 * idx + 2] += color[2]
+        self._frames += 1
+
+        now = time.monotonic()
+        if now - self._started >= self._interval_s:
+            self._log(now - self._started)
+            self._started = now
+
+    def _log(self, elapsed_s: float) -> None:
+        frames = self._frames
+        lights = []
+        for idx, name in enumerate(self._names):
+            if self._last[idx] is None:
+                continue
+            sums = self._sums[3 * idx : 3 * idx + 3]
+            mean = Color(*(round(value / frames) for value in sums))
+            lights.append(f"{name}: {mean.get_css_color_name_colored()}")
+        # attributed to the frame loop calling `add`
+        self._logger.info(
+            f"{frames / elapsed_s:.1f} frames/s | " + " | ".join(lights), stacklevel=3
+        )
+        self._sums = [0] * len(self._sums)
+        self._frames = 0
@@ -1,23 +1,35 @@
+import asyncio
 import json
 import logging
-import os
+import socket
+import threading
 import time
-from typing import Any, Dict
+from concurrent.futures import Future
+from typing import Any, Dict, NamedTuple, Optional, Set, Union
 
 import httpx
 import urllib3
 
+from src.pipeline import LatestFrameSlot, PollScheduler
+from src.tv_transport import BROKEN_CONNECTION_ERRORS, create_tv_transport, httpx_limits
+
 logger = logging.getLogger(__name__)
 
 # Suppress "Unverified HTTPS request is being made" error message
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
+class TvFrame(NamedTuple):
+    """Response body with time.monotonic() of request send and response receipt."""
+
+    data: bytes
+    sent_at: float
+    received_at: float
+
+
 class AmbilightTV:
 
     def __init__(self, config: Dict[str, Any]) -> None:
-        self._client = httpx.Client(verify=False, http2=True)
-
         self._protocol = config.get("protocol", "https://")
         self._ip = config["ip"]
         self._port = config.get("port", "1926")
@@ -25,44 +37,79 @@ class AmbilightTV:
 
         # https://jointspace.sourceforge.net/projectdata/documentation/jasonApi/1/doc/API-Method-ambilight-processed-GET.html
         # https://github.com/eslavnov/pylips/blob/master/docs/Home.md
-        self._path = config.get("path", "ambilight/processed")
+        self.path = ""
+        self._request_path = ""
+        self._full_path = ""
+        self.set_path(config.get("path", "ambilight/processed"))
 
-        self._full_path = (
-            f"{self._protocol}{self._ip}:{self._port}/{self._api_version}/{self._path}"
+        self._wait_for_startup_s = config.get("wait_for_startup_s", 8)
+        self.power_on_time_s = config.get("power_on_time_s", 0)  # extra wait after API is up
+        self._timeout_s = config.get("timeout_s", 0.2)
+        self._transport = create_tv_transport(
+            config.get("transport", "httpx"), self._protocol, self._ip, int(self._port)
         )
 
-        self._wait_for_startup_s = config.get("wait_for_startup_s", 8)
-        self.power_on_time_s = config.get("power_on_time_s", 8)
+    @property
+    def reconnect_cnt(self) -> int:
+        """Connections reopened because the previous one broke."""
+        return self._transport.reconnect_cnt
+
+    def set_path(self, path: str) -> None:
+        """Request another API path from now on, e.g. "ambilight/processed/layer1/left"."""
+        self.path = path
+        self._request_path = f"/{self._api_version}/{path}"
+        self._full_path = f"{self._protocol}{self._ip}:{self._port}{self._request_path}"
+
+    def is_reachable(self, timeout_s: float = 0.5) -> bool:
+        """TCP connect to the API port, succeeds only when the TV API is up."""
+        try:
+            with socket.create_connection((self._ip, int(self._port)), timeout=timeout_s):
+                return True
+        except OSError:
+            return False
 
     def wait_for_startup(self) -> None:
-        _was_enabled = True
-
-        for cnt in range(int(self._wait_for_startup_s / 3)):
-            response = os.system(f"ping -c 1 -W 1 {self._ip} > /dev/null 2>&1")
-            if response == 0:
-                if _was_enabled is False:
-                    logger.error(f"TV is powering on... add {self.power_on_time_s}s more")
-                    time.sleep(self.power_on_time_s)
-                return
+        deadline = time.monotonic() + self._wait_for_startup_s
+        next_log = 0.0
+        was_reachable = True
 
-            _was_enabled = False
-            logger.error(f"TV is not responding for {cnt*3}/{self._wait_for_startup_s}s")
-            time.sleep(2)
+        while not self.is_reachable():
+            was_reachable = False
+            now = time.monotonic()
+            if now > deadline:
+                raise RuntimeError(f"TV IS NOT RESPONDING FOR {self._wait_for_startup_s}s")
+            if now >= next_log:
+                left_s = deadline - now
+                logger.error(f"TV API is not reachable, waiting up to {left_s:.0f}s more")
+                next_log = now + 3
+            time.sleep(0.2)
 
-        raise RuntimeError(f"TV IS NOT RESPONDING FOR {self._wait_for_startup_s}s")  #
+        if not was_reachable and self.power_on_time_s:
+            logger.error(f"TV is powering on... add {self.power_on_time_s}s more")
+            time.sleep(self.power_on_time_s)
+        self.prewarm()
 
-    def get_ambilight_raw(self) -> Any:
+    def prewarm(self) -> None:
+        """Open the TV connection now, so the first frame does not pay for the handshake."""
+        self._transport.prewarm(self._request_path, max(self._timeout_s, 1.0))
+
+    def set_scheduler(self, scheduler: PollScheduler) -> None:
+        """Scheduler of the caller, this client sends a request per call and needs no pacing."""
+
+    def get_ambilight_frame(self) -> TvFrame:
         # logger.debug(f"Sending GET request to:\n{self._full_path}")
-        # HTTPX is faster than requests: 55ms vs 90ms
-        try:
-            # _time = time.time()
-            response = self._client.get(self._full_path, timeout=0.2)
-            # elapsed_time = int((time.time() - _time) * 1000)  # convert to ms
-            # logger.debug(f"[tv_get_request] elapsed time: {elapsed_time} ms")
-        except httpx.RequestError as err:
-            raise RuntimeError(err) from err
+        sent_at = time.monotonic()
+        data = self._transport.get(self._request_path, self._timeout_s)
+        return TvFrame(data, sent_at, time.monotonic())
 
-        return response.text
+    def get_ambilight_bytes(self) -> bytes:
+        return self.get_ambilight_frame().data
+
+    def close(self) -> None:
+        self._transport.close()
+
+    def get_ambilight_raw(self) -> Any:
+        return self.get_ambilight_bytes().decode("utf-8")
 
     def get_ambilight_json(self) -> Dict[str, Any]:
         response_text = self.get_ambilight_raw()
@@ -75,3 +122,169 @@ class AmbilightTV:
             logger.error(f"Decoding JSON error:\n{response_text}")
             raise err
         return data
+
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _shared_event_loop() -> asyncio.AbstractEventLoop:
+    """Event loop running in a background thread, shared by all async TV clients."""
+    global _LOOP  # pylint: disable=global-statement
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="tv_async", daemon=True).start()
+        return _LOOP
+
+
+class AsyncAmbilightTV(AmbilightTV):
+    """Ambilight TV client keeping several staggered requests in flight over one HTTP/2 connection.
+
+    Requests run on an asyncio loop in a background thread, shared by all TVs of the process.
+    A request is started every poll period of the scheduler (at most every `stagger_ms`), while
+    fewer than `in_flight_requests` are pending, so the idle rate and the error backoff of the
+    scheduler also slow down the requests. `get_ambilight_bytes` returns only the newest completed
+    response; responses older than an already delivered one are dropped.
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        super().__init__(config)
+        self._in_flight_requests = config.get("in_flight_requests", 2)
+        self._stagger_s = float(config.get("stagger_ms", 30)) / 1000
+        assert self._in_flight_requests >= 1, "At least one request must be in flight"
+        self._scheduler: Optional[PollScheduler] = None
+
+        self._responses: LatestFrameSlot[Union[TvFrame, Exception]] = LatestFrameSlot()
+        self._sent_seq = 0  # sequence number of the last sent request
+        self._newest_seq = 0  # sequence number of the newest delivered response
+        self.stale_cnt = 0  # responses dropped because a newer one was already delivered
+
+        self._requests: Optional["Future[None]"] = None
+        self._stop_event = threading.Event()
+        self._client_broken = False  # dispatching stops, client is recreated
+        self._broken_in_row = 0
+        self._reconnect_cnt = 0
+
+    @property
+    def reconnect_cnt(self) -> int:
+        return self._reconnect_cnt
+
+    def set_scheduler(self, scheduler: PollScheduler) -> None:
+        """Start requests at the poll rate of `scheduler` instead of every `stagger_ms`."""
+        self._scheduler = scheduler
+
+    def _period(self) -> float:
+        if self._scheduler is None:
+            return self._stagger_s
+        return max(self._stagger_s, self._scheduler.period)
+
+    def prewarm(self) -> None:
+        """Start the requests now, the first frame is ready when the main loop asks for it."""
+        self._start()
+
+    def _start(self) -> None:
+        """Start the requests, also again when they stopped on an unexpected error."""
+        requests = self._requests
+        if requests is not None:
+            if not requests.done() or self._stop_event.is_set():
+                return
+            err = None if requests.cancelled() else requests.exception()
+            logger.error(f"TV requests stopped ({err!r}), restarting them")
+        self._requests = asyncio.run_coroutine_threadsafe(
+            self._run_requests(), _shared_event_loop()
+        )
+
+    async def _run_requests(self) -> None:
+        while not self._stop_event.is_set():
+            # HTTP/2 multiplexes all requests over one connection, HTTP/1.1 needs one per request
+            limits = httpx_limits(self._in_flight_requests)
+            async with httpx.AsyncClient(verify=False, http2=True, limits=limits) as client:
+                await self._dispatch_requests(client)
+            if self._client_broken:
+                # reconnect at once, wait up to 1s when the TV keeps dropping connections
+                await asyncio.sleep(min(1.0, 0.05 * 2 ** min(self._broken_in_row, 5)))
+                self._broken_in_row += 1
+                self._client_broken = False
+                self._reconnect_cnt += 1
+
+    async def _dispatch_requests(self, client: httpx.AsyncClient) -> None:
+        """Start a request every period, deadline based like PollScheduler.wait."""
+        in_flight = asyncio.Semaphore(self._in_flight_requests)
+        pending: Set["asyncio.Task[None]"] = set()
+        deadline = time.monotonic()
+        try:
+            while not self._stop_event.is_set() and not self._client_broken:
+                await in_flight.acquire()
+                task = asyncio.create_task(self._request(client, in_flight))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+                deadline += self._period()
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    deadline = time.monotonic()  # we are late, do not try to catch up
+        finally:
+            # requests in flight finish before the client is closed, also when dispatching failed
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _request(self, client: httpx.AsyncClient, in_flight: asyncio.Semaphore) -> None:
+        self._sent_seq += 1
+        seq = self._sent_seq
+        sent_at = time.monotonic()
+        try:
+            response = await client.get(self._full_path, timeout=self._timeout_s)
+        except BROKEN_CONNECTION_ERRORS as err:
+            if not self._client_broken:
+                logger.warning(f"TV connection broken ({err!r}), reconnecting")
+            self._client_broken = True
+            self._responses.put(err)
+            return
+        except httpx.RequestError as err:
+            self._responses.put(err)
+            return
+        finally:
+            in_flight.release()
+
+        if response.status_code != 200:
+            self._responses.put(RuntimeError(f"TV responded {response.status_code} to {self.path}"))
+            return
+        if seq < self._newest_seq:
+            self.stale_cnt += 1
+            return  # newer response was already delivered
+        self._newest_seq = seq
+        self._broken_in_row = 0
+        self._responses.put(TvFrame(response.content, sent_at, time.monotonic()))
+
+    def get_ambilight_frame(self) -> TvFrame:
+        self._start()
+
+        # a response arrives every period, the poll deadline of the caller may be out of phase
+        timeout_s = self._timeout_s + min(self._period(), 1.0)
+        response = self._responses.take(timeout=timeout_s)
+        if response is None:
+            raise RuntimeError(f"No TV response within {timeout_s:.2f}s")
+        if isinstance(response, Exception):
+            raise RuntimeError(response) from response
+        return response
+
+    def close(self) -> None:
+        """Stop the background requests."""
+        self._stop_event.set()
+        if self._requests is not None:
+            try:
+                self._requests.result(timeout=1)
+            except TimeoutError:
+                self._requests.cancel()
+        super().close()
+
+
+def create_ambilight_tv(config: Dict[str, Any]) -> AmbilightTV:
+    """Create synchronous TV client or async one when more requests in flight are configured."""
+    if config.get("in_flight_requests", 1) > 1:
+        if config.get("transport", "httpx") != "httpx":
+            logger.warning("in_flight_requests > 1 always uses the httpx transport")
+        return AsyncAmbilightTV(config)
+    return AmbilightTV(config)
@@ -0,0 +1,287 @@
+"""Benchmark of the TV -> Hue hot loop without a TV or a Hue bridge.
+
+A local HTTP server replays recorded `ambilight/processed` payloads with configurable latency and
+jitter, and the Hue Entertainment kit is replaced with an in-process sink timestamping every
+update. The normal AmbiHueMain loop runs in between, with the user's light setup and pipeline
+settings when `userconfig.yaml` exists.
+"""
+
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import yaml
+
+from src.ambilight_tv import AmbilightTV, TvFrame
+from src.config_loader import ConfigLoader
+from src.hue_entertainment import HueEntertainmentGroupKit
+from src.main import AmbiHueMain
+from src.tv_process import RingFrame, TvReaderProcess
+
+logger = logging.getLogger(__name__)
+
+# used when the config file does not exist
+BENCHMARK_CONFIG: Dict[str, Any] = {
+    "ambilight_tv": {"ip": "127.0.0.1"},
+    "hue_entertainment_group": {"_name": "benchmark sink", "index": 0},
+    "lights_setup": {
+        "A_name": "left",
+        "A_id": 0,
+        "A_positions": [0, 1, 2, 3],
+        "B_name": "top",
+        "B_id": 1,
+        "B_positions": [6, 7, 8, 9, 10],
+        "C_name": "right",
+        "C_id": 2,
+        "C_positions": [13, 14, 15, 16],
+    },
+}
+
+
+def generate_frames(
+    num_of_frames: int = 300, layout: Tuple[int, int, int] = (4, 9, 4)
+) -> List[bytes]:
+    """Generate slowly changing `ambilight/processed` payloads, similar to a movie scene."""
+    leds = [[random.randrange(256) for _ in range(3)] for _ in range(sum(layout))]
+    frames = []
+    for _ in range(num_of_frames):
+        for led in leds:
+            for idx in range(3):
+                led[idx] = min(255, max(0, led[idx] + random.randint(-12, 12)))
+
+        layer: Dict[str, Dict[str, Dict[str, int]]] = {}
+        offset = 0
+        for side, count in zip(("left", "top", "right"), layout):
+            layer[side] = {str(idx): dict(zip("rgb", leds[offset + idx])) for idx in range(count)}
+            offset += count
+        frames.append(json.dumps({"layer1": layer}).encode())
+    return frames
+
+
+def load_frames(path: Union[str, Path]) -> List[bytes]:
+    """Load recorded payloads, one JSON document per line."""
+    with open(path, "rb") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+class FakeAmbilightServer:
+    """Local HTTP server replaying payloads in a loop, with response latency and jitter."""
+
+    def __init__(self, frames: List[bytes], latency_ms: float = 55, jitter_ms: float = 15) -> None:
+        assert frames, "At least one frame is required"
+        self.requests_cnt = 0
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the TV
+            disable_nagle_algorithm = True  # headers and body are written separately
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                payload = frames[server.requests_cnt % len(frames)]
+                server.requests_cnt += 1
+                delay_ms = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+                time.sleep(max(0.0, delay_ms) / 1000)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args: Any) -> None:
+                pass  # keep benchmark output clean
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeHueSink(HueEntertainmentGroupKit):
+    """In-process replacement of the Hue Entertainment kit, timestamps every update."""
+
+    def __init__(self, config: Dict[str, Any]) -> None:  # pylint: disable=super-init-not-called
+        assert isinstance(config, dict), "Configuration must be a dictionary."
+        self.updates: List[Tuple[float, int, Tuple[float, float, float]]] = []
+
+    @property
+    def failed(self) -> bool:
+        return False  # the sink never goes away
+
+    def check_channels(self, channel_ids: Iterable[int]) -> None:
+        pass  # every channel is accepted
+
+    def park(self, owner: int) -> None:
+        pass  # the benchmark TV never goes away
+
+    def resume(self, owner: int) -> None:
+        pass
+
+    def set_color_space(self, value: str) -> None:
+        pass  # colors are stored as they are
+
+    def set_color(self, light_id: int, color: Tuple[float, float, float]) -> None:
+        self.updates.append((time.monotonic(), light_id, color))
+
+    def __del__(self) -> None:
+        pass  # nothing to stop
+
+
+class _StageTimer:
+    """Wrap a function and sum CPU time of its calls (in the calling thread)."""
+
+    def __init__(self) -> None:
+        self.cpu_s = 0.0
+        self.calls = 0
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        def _timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.cpu_s += time.thread_time() - started
+                self.calls += 1
+
+        return _timed
+
+
+class BenchmarkMain(AmbiHueMain):
+    """AmbiHueMain reading the fake TV, writing to the fake sink and measuring every stage."""
+
+    def __init__(self, config_path: Union[str, Path], tv_port: int) -> None:
+        self._tv_port = tv_port
+        super().__init__(config_path)
+
+        self.stages = {name: _StageTimer() for name in ("fetch", "decode", "mix", "filter", "send")}
+        self._tv.get_ambilight_frame = self.stages["fetch"].wrap(  # type: ignore[method-assign]
+            self._tv.get_ambilight_frame
+        )
+        self._decoder.decode = self.stages["decode"].wrap(  # type: ignore[method-assign]
+            self._decoder.decode
+        )
+        self._light_mixer.mix = self.stages["mix"].wrap(  # type: ignore[method-assign]
+            self._light_mixer.mix
+        )
+        self._filter.update = self.stages["filter"].wrap(  # type: ignore[method-assign]
+            self._filter.update
+        )
+        self._hue.set_color = self.stages["send"].wrap(  # type: ignore[method-assign]
+            self._hue.set_color
+        )
+
+        self.frames_cnt = 0  # TV frames handled, also unchanged ones skipped without sending
+        # TV request of the frame sent -> all lights sent, only frames which sent an update
+        self.latencies: List[float] = []
+
+    def _create_tv(self, config: Dict[str, Any]) -> AmbilightTV:
+        config = {**config, "protocol": "http://", "ip": "127.0.0.1", "port": str(self._tv_port)}
+        return super()._create_tv(config)
+
+    def _create_hue(self, config: Dict[str, Any]) -> HueEntertainmentGroupKit:
+        return FakeHueSink(config)
+
+    def _create_tv_reader(self) -> TvReaderProcess:
+        config = {
+            **self._config_loader.get_ambilight_tv(),
+            "protocol": "http://",
+            "ip": "127.0.0.1",
+            "port": str(self._tv_port),
+        }
+        return TvReaderProcess(config, self._pipeline_config)
+
+    def _process_tv_data(self, tv_frame: TvFrame) -> None:
+        sent_cnt = len(self.sink.updates)
+        super()._process_tv_data(tv_frame)
+        self._frame_done(sent_cnt, tv_frame.sent_at)
+
+    def _process_shared_frame(self, frame: RingFrame) -> None:
+        # fetch and decode run in the reader process, their stage times stay empty
+        sent_cnt = len(self.sink.updates)
+        super()._process_shared_frame(frame)
+        self._frame_done(sent_cnt, frame.sent_at)
+
+    def _frame_done(self, sent_cnt: int, requested_at: float) -> None:
+        """Count the frame, its latency ends with the last light it sent to the sink."""
+        self.frames_cnt += 1
+        updates = self.sink.updates
+        if len(updates) > sent_cnt:  # skipped and fully suppressed frames send nothing
+            self.latencies.append(updates[-1][0] - requested_at)
+
+    @property
+    def tv_latency_s(self) -> float:
+        return self._latency.tv_latency_s
+
+    @property
+    def sink(self) -> FakeHueSink:
+        assert isinstance(self._hue, FakeHueSink)
+        return self._hue
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def run_benchmark(
+    duration_s: float = 10,
+    latency_ms: float = 55,
+    jitter_ms: float = 15,
+    frames_path: Optional[str] = None,
+    config_path: Union[str, Path] = "userconfig.yaml",
+) -> Dict[str, float]:
+    """Run the hot loop against fake TV and fake Hue, print and return the report."""
+    frames = load_frames(frames_path) if frames_path else generate_frames()
+    server = FakeAmbilightServer(frames, latency_ms, jitter_ms)
+    server.start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not Path(config_path).exists():
+            config_path = Path(tmp_dir) / "benchmark_config.yaml"
+            with open(config_path, "w", encoding="utf-8") as file:
+                yaml.dump(BENCHMARK_CONFIG, file)
+
+        ConfigLoader.reset()  # benchmark config may differ from already loaded one
+        app = BenchmarkMain(config_path, server.port)
+        loop = threading.Thread(target=app.run_frames, name="benchmark", daemon=True)
+        started = time.monotonic()
+        loop.start()
+        time.sleep(duration_s)
+        app.stop()
+        loop.join(timeout=5)
+        elapsed = time.monotonic() - started
+    server.stop()
+
+    frames_cnt = app.frames_cnt
+    report = {
+        "duration_s": elapsed,
+        "tv_requests_per_s": server.requests_cnt / elapsed,
+        "frames_per_s": frames_cnt / elapsed,
+        "sent_frames_per_s": len(app.latencies) / elapsed,
+        "hue_updates_per_s": len(app.sink.updates) / elapsed,
+        "latency_p50_ms": _percentile(app.latencies, 50) * 1000,
+        "latency_p95_ms": _percentile(app.latencies, 95) * 1000,
+        "latency_p99_ms": _percentile(app.latencies, 99) * 1000,
+        "tv_latency_estimate_ms": app.tv_latency_s * 1000,
+    }
+    for name, stage in app.stages.items():
+        report[f"cpu_{name}_ms_per_frame"] = stage.cpu_s * 1000 / max(frames_cnt, 1)
+
+    print(f"\nBenchmark: TV latency {latency_ms}+-{jitter_ms} ms, {len(frames)} recorded frames")
+    for key, value in report.items():
+        print(f"  {key:<28} {value:10.3f}")
+    return report
@@ -0,0 +1,242 @@
+"""TV RGB -> CIE xy + brightness within the gamut of every lamp.
+
+Conversion (Philips Hue developer documentation, "RGB to xy"):
+1. per light white balance gains
+2. gamma: "srgb" curve or a plain exponent
+3. linear RGB -> XYZ (wide gamut D65 matrix), xy = X / (X+Y+Z), Y / (X+Y+Z), brightness = Y
+4. xy outside the lamp gamut (A, B or C triangle) is moved to the closest point of the triangle
+
+The conversion is evaluated once for a 33x33x33 grid of RGB values. The table is cached on disk,
+every frame costs a trilinear interpolation per light, followed by per light brightness scaling.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from src.light_map import light_overrides
+
+logger = logging.getLogger(__name__)
+
+XY = Tuple[float, float]
+XYB = Tuple[float, float, float]
+
+# Red, green, blue corners of the lamp gamuts
+GAMUTS: Dict[str, Tuple[XY, XY, XY]] = {
+    "A": ((0.704, 0.296), (0.2151, 0.7106), (0.138, 0.08)),
+    "B": ((0.675, 0.322), (0.409, 0.518), (0.167, 0.04)),
+    "C": ((0.6915, 0.3083), (0.17, 0.7), (0.1532, 0.0475)),
+}
+WHITE_POINT: XY = (0.3127, 0.3290)  # D65, used for black
+
+LUT_SIZE = 33
+_LUT_VERSION = 1
+
+_DEFAULTS: Dict[str, Any] = {
+    "gamut": "C",  # "A", "B" or "C", see Hue light specification
+    "gamma": "srgb",  # "srgb" or exponent, e.g. 2.2
+    "white_balance": [1.0, 1.0, 1.0],  # r, g, b gains applied before gamma
+    "brightness": 1.0,  # brightness scale
+}
+
+
+def _linear(value: float, gamma: Union[str, float]) -> float:
+    if gamma == "srgb":
+        return float(((value + 0.055) / 1.055) ** 2.4 if value > 0.04045 else value / 12.92)
+    return float(value ** float(gamma))
+
+
+def _closest_on_segment(point: XY, start: XY, end: XY) -> XY:
+    d_x, d_y = end[0] - start[0], end[1] - start[1]
+    ratio = ((point[0] - start[0]) * d_x + (point[1] - start[1]) * d_y) / (d_x**2 + d_y**2)
+    ratio = min(1.0, max(0.0, ratio))
+    return start[0] + ratio * d_x, start[1] + ratio * d_y
+
+
+def clamp_to_gamut(point: XY, gamut: Tuple[XY, XY, XY]) -> XY:
+    """Return `point` if inside the gamut triangle, otherwise the closest point on its edges."""
+
+    def side(start: XY, end: XY) -> float:
+        return (end[0] - start[0]) * (point[1] - start[1]) - (end[1] - start[1]) * (
+            point[0] - start[0]
+        )
+
+    red, green, blue = gamut
+    sides = (side(red, green), side(green, blue), side(blue, red))
+    if all(value >= 0 for value in sides) or all(value <= 0 for value in sides):
+        return point
+
+    candidates = [
+        _closest_on_segment(point, start, end)
+        for start, end in ((red, green), (green, blue), (blue, red))
+    ]
+    return min(candidates, key=lambda cand: (cand[0] - point[0]) ** 2 + (cand[1] - point[1]) ** 2)
+
+
+def rgb_to_xyb(
+    rgb: Sequence[float],
+    gamut: str = "C",
+    gamma: Union[str, float] = "srgb",
+    white_balance: Sequence[float] = (1.0, 1.0, 1.0),
+) -> XYB:
+    """Exact conversion of one RGB8 color, used to build the lookup table."""
+    red, green, blue = (
+        _linear(min(1.0, channel * gain / 255), gamma) for channel, gain in zip(rgb, white_balance)
+    )
+    x_val = red * 0.664511 + green * 0.154324 + blue * 0.162028
+    y_val = red * 0.283881 + green * 0.668433 + blue * 0.047685
+    z_val = red * 0.000088 + green * 0.072310 + blue * 0.986039
+    total = x_val + y_val + z_val
+    if total <= 0:
+        return (*WHITE_POINT, 0.0)
+
+    x_chroma, y_chroma = clamp_to_gamut((x_val / total, y_val / total), GAMUTS[gamut])
+    return x_chroma, y_chroma, min(1.0, y_val)
+
+
+class ColorLut:
+    """RGB8 -> xyb lookup table with trilinear interpolation."""
+
+    def __init__(
+        self,
+        gamut: str = "C",
+        gamma: Union[str, float] = "srgb",
+        white_balance: Sequence[float] = (1.0, 1.0, 1.0),
+        cache_dir: Optional[Union[str, Path]] = None,
+    ) -> None:
+        assert gamut in GAMUTS, f"Unknown gamut: {gamut}"
+        assert gamma == "srgb" or float(gamma) > 0, f"Invalid gamma: {gamma}"
+        assert len(white_balance) == 3, "white_balance needs r, g, b gains"
+        self._params = (gamut, gamma, tuple(float(gain) for gain in white_balance))
+        self._table: "array[float]" = array("f")
+
+        path = self._cache_path(cache_dir) if cache_dir else None
+        if path is None or not self._load(path):
+            self._build()
+            if path is not None:
+                self._save(path)
+
+    def _cache_path(self, cache_dir: Union[str, Path]) -> Path:
+        key = json.dumps([_LUT_VERSION, LUT_SIZE, *self._params])
+        return Path(cache_dir) / f"lut_{hashlib.sha1(key.encode()).hexdigest()[:16]}.bin"
+
+    def _load(self, path: Path) -> bool:
+        table: "array[float]" = array("f")
+        try:
+            with open(path, "rb") as file:
+                table.fromfile(file, 3 * LUT_SIZE**3)
+        except (OSError, EOFError):
+            return False
+        self._table = table
+        logger.info(f"Color table loaded from {path}")
+        return True
+
+    def _save(self, path: Path) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as file:
+                self._table.tofile(file)
+            os.replace(tmp_path, path)  # readers never see a partial table
+        except OSError as err:
+            logger.warning(f"Color table not cached: {err}")
+
+    def _build(self) -> None:
+        gamut, gamma, white_balance = self._params
+        step = 255 / (LUT_SIZE - 1)
+        table = array("f", bytes(4 * 3 * LUT_SIZE**3))
+        idx = 0
+        for red in range(LUT_SIZE):
+            for green in range(LUT_SIZE):
+                for blue in range(LUT_SIZE):
+                    rgb = (red * step, green * step, blue * step)
+                    table[idx : idx + 3] = array("f", rgb_to_xyb(rgb, gamut, gamma, white_balance))
+                    idx += 3
+        self._table = table
+        logger.info(f"Color table built for gamut {gamut}, gamma {gamma}")
+
+    def lookup(self, rgb: Sequence[int]) -> XYB:
+        """Interpolated (x, y, brightness) of RGB8 color."""
+        scale = (LUT_SIZE - 1) / 255
+        pos_r, pos_g, pos_b = rgb[0] * scale, rgb[1] * scale, rgb[2] * scale
+        idx_r = min(int(pos_r), LUT_SIZE - 2)
+        idx_g = min(int(pos_g), LUT_SIZE - 2)
+        idx_b = min(int(pos_b), LUT_SIZE - 2)
+        frac_r, frac_g, frac_b = pos_r - idx_r, pos_g - idx_g, pos_b - idx_b
+
+        # 8 cube corners: c<r><g><b>, strides of r, g and b steps in the flat table
+        table = self._table
+        s_g = 3 * LUT_SIZE
+        s_r = s_g * LUT_SIZE
+        c000 = idx_r * s_r + idx_g * s_g + 3 * idx_b
+        c010, c100 = c000 + s_g, c000 + s_r
+        c110 = c100 + s_g
+        w00, w01 = (1 - frac_r) * (1 - frac_g), (1 - frac_r) * frac_g
+        w10, w11 = frac_r * (1 - frac_g), frac_r * frac_g
+        inv_b = 1 - frac_b
+
+        # x, y and brightness written out, a loop would allocate a list per lookup
+        x_val = (
+            w00 * (table[c000] * inv_b + table[c000 + 3] * frac_b)
+            + w01 * (table[c010] * inv_b + table[c010 + 3] * frac_b)
+            + w10 * (table[c100] * inv_b + table[c100 + 3] * frac_b)
+            + w11 * (table[c110] * inv_b + table[c110 + 3] * frac_b)
+        )
+        y_val = (
+            w00 * (table[c000 + 1] * inv_b + table[c000 + 4] * frac_b)
+            + w01 * (table[c010 + 1] * inv_b + table[c010 + 4] * frac_b)
+            + w10 * (table[c100 + 1] * inv_b + table[c100 + 4] * frac_b)
+            + w11 * (table[c110 + 1] * inv_b + table[c110 + 4] * frac_b)
+        )
+        bri = (
+            w00 * (table[c000 + 2] * inv_b + table[c000 + 5] * frac_b)
+            + w01 * (table[c010 + 2] * inv_b + table[c010 + 5] * frac_b)
+            + w10 * (table[c100 + 2] * inv_b + table[c100 + 5] * frac_b)
+            + w11 * (table[c110 + 2] * inv_b + table[c110 + 5] * frac_b)
+        )
+        return x_val, y_val, bri
+
+
+class ColorEngine:
+    """Convert mixed light colors to xyb, every light may have its own gamut and corrections.
+
+    Used when `color: mode: "xyb"` is configured, "rgb" mode sends TV colors as they are.
+
+    Config example:
+        color:
+          mode: "xyb"
+          gamut: "C"
+          lights:  # optional per light overrides, by light name
+            sofa_behind:
+              gamut: "A"
+              white_balance: [1.0, 0.9, 0.8]
+              brightness: 0.7
+    """
+
+    def __init__(
+        self, light_names: List[str], config: Dict[str, Any], cache_dir: Optional[str] = None
+    ) -> None:
+        overrides = config.get("lights") or {}
+        defaults = {**_DEFAULTS, **{k: v for k, v in config.items() if k not in ("lights", "mode")}}
+
+        luts: Dict[str, ColorLut] = {}  # lights with the same settings share one table
+        self._luts: List[ColorLut] = []
+        self._brightness: List[float] = []
+        for name in light_names:
+            light = {**defaults, **light_overrides(name, overrides)}
+            key = json.dumps([light["gamut"], light["gamma"], light["white_balance"]])
+            if key not in luts:
+                luts[key] = ColorLut(
+                    light["gamut"], light["gamma"], light["white_balance"], cache_dir
+                )
+            self._luts.append(luts[key])
+            self._brightness.append(float(light["brightness"]))
+
+    def convert(self, light_idx: int, rgb: Tuple[int, int, int]) -> XYB:
+        """(x, y, brightness) of a light color."""
+        x_chroma, y_chroma, bri = self._luts[light_idx].lookup(rgb)
+        return x_chroma, y_chroma, min(1.0, bri * self._brightness[light_idx])
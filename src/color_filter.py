@@ -0,0 +1,184 @@
+"""Temporal smoothing and change detection between ColorMixer and the Hue bridge.
+
+Every light has its own filter ("none", "ema" or "one_euro") and a delta threshold. A filtered
+color is sent only when it differs from the last sent color by more than the threshold, which
+keeps the streaming queue short and removes flicker.
+"""
+
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.light_map import light_overrides
+
+logger = logging.getLogger(__name__)
+
+RGB = Tuple[int, int, int]
+
+_DEFAULTS: Dict[str, Any] = {
+    "mode": "none",  # "none", "ema" or "one_euro"
+    "alpha": 0.5,  # ema: weight of the newest sample, 1.0 = no smoothing
+    "min_cutoff": 1.0,  # one_euro: minimum cutoff frequency [Hz], lower = smoother
+    "beta": 0.05,  # one_euro: speed coefficient, higher = less lag on fast changes
+    "d_cutoff": 1.0,  # one_euro: cutoff frequency for the derivative [Hz]
+    "threshold": 0.0,  # minimum color distance to send an update, 0 = send every change
+    "distance": "rgb",  # "rgb" (euclidean) or "redmean" (perceptual approximation)
+}
+
+
+def rgb_distance(color_a: RGB, color_b: RGB) -> float:
+    """Euclidean distance in RGB space."""
+    d_red, d_green, d_blue = (
+        color_a[0] - color_b[0],
+        color_a[1] - color_b[1],
+        color_a[2] - color_b[2],
+    )
+    return math.sqrt(d_red**2 + d_green**2 + d_blue**2)
+
+
+def redmean_distance(color_a: RGB, color_b: RGB) -> float:
+    """Low-cost perceptual color distance: https://www.compuphase.com/cmetric.htm"""
+    red_mean = (color_a[0] + color_b[0]) / 2
+    d_red, d_green, d_blue = (
+        color_a[0] - color_b[0],
+        color_a[1] - color_b[1],
+        color_a[2] - color_b[2],
+    )
+    weighted = (
+        (2 + red_mean / 256) * d_red**2 + 4 * d_green**2 + (2 + (255 - red_mean) / 256) * d_blue**2
+    )
+    return math.sqrt(weighted) / 3  # scaled to roughly match the RGB distance
+
+
+_DISTANCES = {"rgb": rgb_distance, "redmean": redmean_distance}
+
+
+class LightFilter:
+    """Filter for a single light."""
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        config = {**_DEFAULTS, **config}
+        assert config["mode"] in ("none", "ema", "one_euro"), f"Unknown filter: {config['mode']}"
+        assert config["distance"] in _DISTANCES, f"Unknown distance: {config['distance']}"
+        assert 0 < config["alpha"] <= 1, "alpha must be in range (0, 1]"
+
+        self._mode = config["mode"]
+        self._alpha = config["alpha"]
+        self._min_cutoff = config["min_cutoff"]
+        self._beta = config["beta"]
+        self._d_cutoff = config["d_cutoff"]
+        self._threshold = config["threshold"]
+        self._distance = _DISTANCES[config["distance"]]
+
+        self._value: Optional[List[float]] = None  # filtered color, updated in place
+        self._input: Optional[RGB] = None  # last unfiltered color
+        self._derivative = [0.0, 0.0, 0.0]  # one_euro: filtered speed of change
+        self._timestamp = 0.0
+        self._last_sent: Optional[RGB] = None
+
+    @property
+    def settled(self) -> bool:
+        """True when the filter output would not change for the same input again."""
+        value, color = self._value, self._input
+        if value is None or color is None:
+            return True
+        return (
+            abs(value[0] - color[0]) < 0.5
+            and abs(value[1] - color[1]) < 0.5
+            and abs(value[2] - color[2]) < 0.5
+        )
+
+    @staticmethod
+    def _smoothing(cutoff: float, d_time: float) -> float:
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / d_time)
+
+    def _smooth(self, color: RGB, timestamp: float) -> RGB:
+        value = self._value
+        if value is None:
+            value = self._value = [float(channel) for channel in color]
+        elif self._mode == "none":
+            value[0], value[1], value[2] = color
+        elif self._mode == "ema":
+            for idx in range(3):
+                value[idx] += self._alpha * (color[idx] - value[idx])
+        else:  # one_euro
+            d_time = max(timestamp - self._timestamp, 1e-3)
+            d_alpha = self._smoothing(self._d_cutoff, d_time)
+            for idx in range(3):
+                prev = value[idx]
+                speed = (color[idx] - prev) / d_time
+                self._derivative[idx] += d_alpha * (speed - self._derivative[idx])
+                cutoff = self._min_cutoff + self._beta * abs(self._derivative[idx])
+                value[idx] = prev + self._smoothing(cutoff, d_time) * (color[idx] - prev)
+        self._timestamp = timestamp
+
+        return round(value[0]), round(value[1]), round(value[2])
+
+    def update(self, color: RGB, timestamp: float) -> Optional[RGB]:
+        """Filter new color. Return color to send or None if change is below the threshold."""
+        self._input = color
+        filtered = self._smooth(color, timestamp)
+
+        if self._last_sent is not None:
+            if filtered == self._last_sent:
+                return None
+            if self._distance(filtered, self._last_sent) < self._threshold:
+                return None
+
+        self._last_sent = filtered
+        return filtered
+
+    def resend(self) -> None:
+        """Send the next filtered color even when it equals the last sent one."""
+        self._last_sent = None
+
+
+class ColorFilter:
+    """Filter stage for all lights.
+
+    Config example:
+        filter:
+          mode: "ema"
+          alpha: 0.4
+          threshold: 3
+          lights:  # optional per light overrides, by light name
+            sofa_behind:
+              mode: "one_euro"
+    """
+
+    def __init__(self, light_names: List[str], config: Dict[str, Any]) -> None:
+        overrides = config.get("lights") or {}
+        defaults = {key: value for key, value in config.items() if key != "lights"}
+        self._filters = [
+            LightFilter({**defaults, **light_overrides(name, overrides)}) for name in light_names
+        ]
+        self._filtered: List[Optional[RGB]] = [None] * len(light_names)  # reused every frame
+        self.suppressed_cnt = 0  # updates skipped because of the threshold
+
+    @property
+    def settled(self) -> bool:
+        """True when all lights reached their target colors."""
+        for light in self._filters:
+            if not light.settled:
+                return False
+        return True
+
+    def resend(self) -> None:
+        """Send colors of all lights with the next update, e.g. to a restarted Hue stream."""
+        for light in self._filters:
+            light.resend()
+
+    def update(self, colors: List[RGB], timestamp: float) -> List[Optional[RGB]]:
+        """Filter colors of all lights, None means: do not send update for this light.
+
+        The returned list is reused for the next frame.
+        """
+        filtered = self._filtered
+        filters = self._filters
+        for idx in range(len(filters)):  # pylint: disable=consider-using-enumerate
+            color = filters[idx].update(colors[idx], timestamp)
+            filtered[idx] = color
+            if color is None:
+                self.suppressed_cnt += 1
+        return filtered
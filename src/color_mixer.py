@@ -1,7 +1,18 @@
 import logging
-from typing import Any, Dict, List
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
 
 from src.colors import Color
+from src.geometry import ScreenGeometry
+from src.light_map import LightMap, LightSpec
+from src.tv_decoder import AmbilightDecoder
+
+try:
+    import numpy as np  # type: ignore[import-not-found,unused-ignore]  # optional, vectorized
+
+    _NUMPY_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _NUMPY_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
@@ -17,64 +28,188 @@ class ColorMixer:
         # [2] 2Left                                                     [14] 1Right
         # [1] 1Left                                                     [15] 2Right
         # [0] 0Left                                                     [16] 3Right
-        self._colors: List[Color] = []
-        self._num_of_left_right_colors = -1  # Number of left/right colors
-
-    def apply_tv_data(self, data: Dict[str, Any]) -> None:
-        self._colors = []  # reset colors
-        self._num_of_left_right_colors = 0
+        # Colors are stored flat as r, g, b bytes: [0]r [0]g [0]b [1]r ...
+        self._rgb: "array[int]" = array("B")
+        self._layout: Tuple[int, int, int] = (0, 0, 0)  # number of LEDs: left, top, right
+        self._decoder = AmbilightDecoder()
 
-        for color in data["layer1"]["left"].values():
-            self._colors.append(Color(*color.values()))
-            self._num_of_left_right_colors += 1
+    @property
+    def _colors(self) -> List[Color]:
+        rgb = self._rgb
+        return [Color(rgb[idx], rgb[idx + 1], rgb[idx + 2]) for idx in range(0, len(rgb), 3)]
 
-        for color in data["layer1"]["top"].values():
-            self._colors.append(Color(*color.values()))
+    def apply_tv_data(self, data: Dict[str, Any]) -> None:
+        self.apply_tv_buffer(self._decoder.decode_dict(data), self._decoder.layout)
 
-        right_colors = list(data["layer1"]["right"].values())
-        for color in right_colors[::-1]:  # invert RIGHT order!
-            self._colors.append(Color(*color.values()))
+    def apply_tv_buffer(self, rgb: "array[int]", layout: Tuple[int, int, int]) -> None:
+        """Use colors decoded by AmbilightDecoder. Buffer is not copied."""
+        self._rgb = rgb
+        self._layout = layout
 
         # print(f"TAB:\n{self._colors}\n")
 
     def get_average_color(self, positions: List[int]) -> Color:
         """Calculate the average color from the collected colors."""
-        assert self._colors, "Colors have not been set yet."
+        assert self._rgb, "Colors have not been set yet."
         assert isinstance(positions, list)
         assert all(isinstance(pos, int) for pos in positions)
         assert all(
-            0 <= pos < len(self._colors) for pos in positions
+            0 <= pos < len(self._rgb) // 3 for pos in positions
         ), "Position indices are out of bounds."
 
-        color = Color(0, 0, 0)
+        rgb = self._rgb
+        red = green = blue = 0
         for pos in positions:
-            color.red += self._colors[pos].red
-            color.green += self._colors[pos].green
-            color.blue += self._colors[pos].blue
+            red += rgb[3 * pos]
+            green += rgb[3 * pos + 1]
+            blue += rgb[3 * pos + 2]
 
-        color.red //= len(positions)
-        color.green //= len(positions)
-        color.blue //= len(positions)
-        return color
+        return Color(red // len(positions), green // len(positions), blue // len(positions))
 
     def print_colors(self) -> None:
         """Print the colors in a formatted way."""
-        assert self._colors, "Colors have not been set yet."
+        assert self._rgb, "Colors have not been set yet."
 
-        if logger.getEffectiveLevel() != logging.DEBUG:
+        if not logger.isEnabledFor(logging.DEBUG):
             return  # only print if debug is enabled
 
-        top_colors = self._colors[self._num_of_left_right_colors : -self._num_of_left_right_colors]
+        colors = self._colors
+        num_left, num_top, num_right = self._layout
+        left_colors = colors[:num_left][::-1]  # top to bottom
+        right_colors = colors[num_left + num_top :]  # top to bottom
 
         # First line with top colors
+        top_colors = colors[num_left : num_left + num_top]
         logger.debug(" | ".join(color.get_css_color_name_colored() for color in top_colors))
 
-        # Next lines with left and right colors
-        for color_height in range(self._num_of_left_right_colors):  # 0, 1, 2, 3
-            left_color = self._colors[self._num_of_left_right_colors - color_height - 1]
-            right_color = self._colors[-(color_height + 1)]
-
-            logger.debug(
-                f"{left_color.get_css_color_name_colored()} | \t\t\t\t\t\t\t\t\t"
-                f"{right_color.get_css_color_name_colored()}"
-            )
+        # Next lines with left and right colors, sides may have different numbers of LEDs
+        empty = " " * 7  # width of a color name
+        for row in range(max(num_left, num_right)):  # 0, 1, 2, 3
+            left = left_colors[row].get_css_color_name_colored() if row < num_left else empty
+            right = right_colors[row].get_css_color_name_colored() if row < num_right else ""
+            logger.debug(f"{left} | \t\t\t\t\t\t\t\t\t{right}")
+
+
+class LightMixer:
+    """Mix colors of all lights at once using the light map compiled for the TV layout.
+
+    Every light color is a weighted mean of its LED positions. Lights with a location use
+    distance kernels of the screen geometry as weights. With NumPy installed all lights are
+    computed with a single matrix multiply per frame, otherwise a pure Python fallback is used.
+    """
+
+    def __init__(
+        self,
+        lights: List[LightSpec],
+        backend: str = "auto",
+        geometry: Optional[ScreenGeometry] = None,
+    ) -> None:
+        if backend == "auto":
+            backend = "numpy" if _NUMPY_AVAILABLE else "python"
+        if backend == "numpy" and not _NUMPY_AVAILABLE:
+            logger.warning("numpy is not installed, using pure Python mixer")
+            backend = "python"
+        assert backend in ("numpy", "python"), f"Unknown mixer backend: {backend}"
+        self.backend = backend
+
+        self._lights = lights
+        self.geometry = geometry  # screen geometry of lights with a location
+        self._light_map: Optional[LightMap] = None  # compiled for the current TV layout
+        self._matrix: Any = None  # numpy (lights x LEDs) weight matrix
+
+        # Previous frame, used to recompute only lights with changed LEDs
+        self._prev_rgb: "array[int]" = array("B")
+        self._prev_view = memoryview(self._prev_rgb)  # accepts any r/g/b buffer, e.g. mmap views
+        self._prev_leds: Any = None  # numpy view of `_prev_rgb`
+        self._colors: List[Tuple[int, int, int]] = [(0, 0, 0)] * len(lights)
+        self._prepared = False  # compiled ahead of the first frame, no previous frame yet
+        self.recomputed_cnt = 0  # number of light colors computed (not reused)
+
+    @property
+    def layout(self) -> Optional[Tuple[int, int, int]]:
+        """TV layout the light map is compiled for, None before the first frame."""
+        return self._light_map.layout if self._light_map else None
+
+    def prepare(self, layout: Tuple[int, int, int]) -> None:
+        """Compile the light map ahead of the first frame, e.g. in a config reload thread."""
+        self._compile(layout)
+        self._prepared = True
+
+    def _compile(self, layout: Tuple[int, int, int]) -> None:
+        light_map = LightMap(self._lights, layout, self.geometry)
+        self._light_map = light_map
+        self._prev_rgb = array("B", bytes(3 * sum(layout)))
+        self._prev_view = memoryview(self._prev_rgb)
+
+        if self.backend == "numpy":
+            matrix = np.zeros((len(self._lights), sum(layout)), dtype=np.float64)
+            for light_idx, (positions, weights) in enumerate(
+                zip(light_map.positions, light_map.weights)
+            ):
+                for pos, weight in zip(positions, weights):
+                    matrix[light_idx, pos] += weight
+            self._matrix = matrix
+            self._prev_leds = np.frombuffer(self._prev_rgb, dtype=np.uint8).reshape(-1, 3)
+
+    def mix(self, rgb: "array[int]", layout: Tuple[int, int, int]) -> List[Tuple[int, int, int]]:
+        """Return (r, g, b) color for every light, in lights order.
+
+        Only lights using LEDs changed since the previous frame are recomputed. The returned list
+        is reused for the next frame.
+        """
+        all_changed = self._light_map is None or layout != self._light_map.layout
+        if all_changed:  # TV layout changed (or first frame)
+            self._compile(layout)
+        elif self._prepared:
+            all_changed = True  # compiled by `prepare`, previous frame is unknown
+        self._prepared = False
+
+        if self.backend == "numpy":
+            self._mix_numpy(rgb, all_changed)
+        else:
+            self._mix_python(rgb, all_changed)
+        self._prev_view[:] = rgb
+        return self._colors
+
+    def _mix_numpy(self, rgb: "array[int]", all_changed: bool) -> None:
+        leds = np.frombuffer(rgb, dtype=np.uint8).reshape(-1, 3)
+        if all_changed:
+            changed = np.ones(len(self._lights), dtype=bool)
+        else:
+            changed_leds = (leds != self._prev_leds).any(axis=1)
+            changed = (self._matrix[:, changed_leds] != 0).any(axis=1)
+            if not changed.any():
+                return
+
+        # small epsilon keeps uniform mean equal to integer division of sums
+        mixed = (self._matrix[changed] @ leds + 1e-3).astype(np.uint8).tolist()
+        for light_idx, row in zip(np.flatnonzero(changed).tolist(), mixed):
+            self._colors[light_idx] = (row[0], row[1], row[2])
+        self.recomputed_cnt += len(mixed)
+
+    def _mix_python(self, rgb: "array[int]", all_changed: bool) -> None:
+        assert self._light_map is not None
+        prev = self._prev_rgb
+        light_map = self._light_map
+        for light_idx, (positions, weights) in enumerate(
+            zip(light_map.positions, light_map.weights)
+        ):
+            if not all_changed:
+                for pos in positions:
+                    idx = 3 * pos
+                    if (
+                        rgb[idx] != prev[idx]
+                        or rgb[idx + 1] != prev[idx + 1]
+                        or rgb[idx + 2] != prev[idx + 2]
+                    ):
+                        break
+                else:
+                    continue  # LEDs of this light did not change
+
+            red = green = blue = 0.0
+            for pos, weight in zip(positions, weights):
+                red += rgb[3 * pos] * weight
+                green += rgb[3 * pos + 1] * weight
+                blue += rgb[3 * pos + 2] * weight
+            self._colors[light_idx] = (int(red + 1e-3), int(green + 1e-3), int(blue + 1e-3))
+            self.recomputed_cnt += 1
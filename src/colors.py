@@ -1,23 +1,90 @@
 #
 
 import logging
-from typing import Dict, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import webcolors  # type: ignore
 
 logger = logging.getLogger(__name__)
 
 
-class Color:
-    def __init__(self, red: int, green: int, blue: int):
-        assert isinstance(red, int) and 0 <= red <= 255, "Value must be an integer 0-255"
-        assert isinstance(green, int) and 0 <= green <= 255, "Value must be an integer 0-255"
-        assert isinstance(blue, int) and 0 <= blue <= 255, "Value must be an integer 0-255"
+_Rgb = Tuple[int, int, int]
+# k-d tree node: color, index in the CSS3 list, name, split axis, lower and higher subtree
+_Node = Tuple[_Rgb, int, str, int, Optional["_Node"], Optional["_Node"]]
 
-        self.red = red
-        self.green = green
-        self.blue = blue
-        # self.print_debug_line()
+
+def _build_tree(colors: List[Tuple[_Rgb, int, str]], depth: int = 0) -> Optional[_Node]:
+    if not colors:
+        return None
+    axis = depth % 3
+    colors = sorted(colors, key=lambda color: color[0][axis])
+    median = len(colors) // 2
+    rgb, index, name = colors[median]
+    return (
+        rgb,
+        index,
+        name,
+        axis,
+        _build_tree(colors[:median], depth + 1),
+        _build_tree(colors[median + 1 :], depth + 1),
+    )
+
+
+def _css3_tree() -> Tuple[Dict[_Rgb, str], Optional[_Node]]:
+    """Exact names and a k-d tree of all CSS3 colors, built once at import."""
+    colors = [
+        (tuple(webcolors.name_to_rgb(name)), index, name)
+        for index, name in enumerate(webcolors.names("css3"))
+    ]
+    exact = {rgb: webcolors.rgb_to_name(rgb) for rgb, _, _ in colors}
+    return exact, _build_tree(colors)
+
+
+_EXACT_NAMES, _TREE = _css3_tree()
+
+
+def css_color_name(rgb: Tuple[int, int, int]) -> str:
+    """Exact CSS3 name of the color or the closest one, found in a k-d tree of CSS3 colors.
+
+    Of equally close colors the later CSS3 name wins.
+    """
+    color_name = _EXACT_NAMES.get(rgb)
+    if color_name is not None:
+        return color_name
+
+    red, green, blue = rgb
+    best_distance, best_index, best_name = 3 * 256**2, -1, ""
+    pending: List[Tuple[Optional[_Node], int]] = [(_TREE, 0)]  # subtree, its distance bound
+    while pending:
+        node, bound = pending.pop()
+        if bound > best_distance:
+            continue  # subtree cannot hold a closer color
+        while node is not None:
+            color, index, name, axis, lower, higher = node
+            distance = (color[0] - red) ** 2 + (color[1] - green) ** 2 + (color[2] - blue) ** 2
+            if distance < best_distance or (distance == best_distance and index > best_index):
+                best_distance, best_index, best_name = distance, index, name
+            delta = rgb[axis] - color[axis]
+            if delta < 0:
+                pending.append((higher, delta * delta))
+                node = lower
+            else:
+                pending.append((lower, delta * delta))
+                node = higher
+    return best_name
+
+
+class Color(NamedTuple):
+    """Immutable RGB8 color. Values are not validated, use `check` for untrusted input."""
+
+    red: int
+    green: int
+    blue: int
+
+    def check(self) -> "Color":
+        for value in (self.red, self.green, self.blue):
+            assert isinstance(value, int) and 0 <= value <= 255, "Value must be an integer 0-255"
+        return self
 
     def get_dict(self) -> Dict[str, int]:
         rgb_dict = {
@@ -28,8 +95,7 @@ class Color:
         return rgb_dict
 
     def get_tuple(self) -> Tuple[int, int, int]:
-        rgb_tuple = self.red, self.green, self.blue
-        return rgb_tuple
+        return self  # Color is a tuple already
 
     def get_hue(self) -> Tuple[int, int, int]:
         # Normalize RGB values to the range 0-1
@@ -68,26 +134,8 @@ class Color:
 
         return hue_philips, saturation_philips, brightness_philips
 
-    def __closest_color(self) -> str:
-        min_colors = {}
-        for name in webcolors.names("css3"):
-            r_c, g_c, b_c = webcolors.name_to_rgb(name)
-            rd = (r_c - self.red) ** 2
-            gd = (g_c - self.green) ** 2
-            bd = (b_c - self.blue) ** 2
-            min_colors[(rd + gd + bd)] = name
-        _name = min_colors[min(min_colors.keys())]
-        assert isinstance(_name, str)
-        return _name
-
     def get_css_color_name(self) -> str:
-        try:
-            color_name = webcolors.rgb_to_name(self.get_tuple())  # specific color
-            assert isinstance(color_name, str)
-        except ValueError:
-            color_name = self.__closest_color()  # the closest color
-            assert isinstance(color_name, str)
-        return color_name
+        return css_color_name(self)
 
     def get_css_color_name_colored(self) -> str:
         color_code = f"\033[38;2;{self.red};{self.green};{self.blue}m"  # RGB w ANSI
@@ -1,9 +1,11 @@
 import logging
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 import yaml
 
+from src.light_map import LightSpec, parse_lights_setup
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,6 +13,9 @@ class ConfigLoader:
     """Singleton class to load and access configuration data from a YAML file.
 
     Config can be provided via a file or an environment variable USER_CONFIG_YAML
+
+    Optional `rooms` list runs several TV -> Entertainment area pipelines in one process. Every
+    room may override any top level section, missing sections are taken from the top level.
     """
 
     _instance: Optional["ConfigLoader"] = None
@@ -22,15 +27,75 @@ class ConfigLoader:
             cls._instance._load(config_path)
         return cls._instance
 
+    @classmethod
+    def reset(cls) -> None:
+        """Forget loaded configuration, next ConfigLoader() call loads the file again."""
+        cls._instance = None
+
+    @classmethod
+    def from_dict(cls, config_data: Dict[str, Any]) -> "ConfigLoader":
+        """Create a standalone (not singleton) loader, e.g. for a single room."""
+        loader = super().__new__(cls)
+        loader._config_data = config_data
+        loader._validate()
+        return loader
+
+    @classmethod
+    def from_file(cls, config_path: Union[str, Path]) -> "ConfigLoader":
+        """Load a standalone (not singleton) loader, e.g. to reload a changed file."""
+        loader = super().__new__(cls)
+        loader._load(config_path)
+        return loader
+
     def _load(self, config_path: Union[str, Path]) -> None:
 
         with open(config_path, "r", encoding="utf-8") as file:
             self._config_data = yaml.safe_load(file)
 
+        if self._config_data.get("rooms"):
+            self.get_rooms()  # validates every room
+        else:
+            self._validate()
+
+    def _validate(self) -> None:
         assert self.get_hue_entertainment()
         assert self.get_ambilight_tv()
         assert self.get_lights_setup()
 
+    def get_rooms(self) -> List["ConfigLoader"]:
+        """Configuration of every room, empty list when `rooms` are not configured.
+
+        Process wide sections (`metrics`, `reload`) are not inherited by rooms.
+        """
+        rooms = self._config_data.get("rooms") or []
+        assert isinstance(rooms, list), "rooms must be a list"
+
+        defaults = {key: value for key, value in self._config_data.items() if key != "rooms"}
+        defaults.pop("metrics", None)
+        defaults.pop("reload", None)
+        loaders = []
+        for idx, room in enumerate(rooms):
+            assert isinstance(room, dict), f"Room {idx} must be a dictionary"
+            loaders.append(ConfigLoader.from_dict({**defaults, "name": f"room{idx}", **room}))
+
+        names = [loader.get_name() for loader in loaders]
+        assert len(set(names)) == len(names), f"Room names must be unique: {names}"
+
+        # rooms on one bridge share its stream, which has a single color space
+        modes: Dict[Any, str] = {}
+        for loader in loaders:
+            hue = loader.get_hue_entertainment()
+            bridge = (hue.get("_ip_address"), hue.get("_username"))
+            mode = loader.get_color().get("mode", "rgb")
+            assert (
+                modes.setdefault(bridge, mode) == mode
+            ), f"Rooms on bridge {bridge[0]} must use the same color mode"
+        return loaders
+
+    def get_name(self) -> str:
+        """Room name, empty for single room configuration."""
+        return str(self._config_data.get("name", ""))
+
     def get(self, key: str, default: Any = None) -> Dict[str, Any]:
         _ret = self._config_data.get(key, default)
         assert isinstance(_ret, dict)
@@ -46,23 +111,57 @@ class ConfigLoader:
         assert isinstance(_ret, dict)
         return _ret
 
-    def get_lights_setup(self) -> Dict[str, Any]:
-        _ret = self._config_data.get("lights_setup")
+    def get_pipeline(self) -> Dict[str, Any]:
+        """Optional loop settings, empty dict means defaults (sequential loop)."""
+        _ret = self._config_data.get("pipeline") or {}
         assert isinstance(_ret, dict)
+        return _ret
 
-        lights = {}
-        for key in ["A", "B", "C", "D"]:  # up to 4 lights
-            if f"{key}_name" not in _ret:
-                continue  # skip if no name is provided
+    def get_filter(self) -> Dict[str, Any]:
+        """Optional smoothing filter settings, empty dict means no filtering."""
+        _ret = self._config_data.get("filter") or {}
+        assert isinstance(_ret, dict)
+        return _ret
 
-            name = _ret.get(f"{key}_name")
-            id_ = _ret.get(f"{key}_id")
-            positions = _ret.get(f"{key}_positions")
-            if name is not None:
-                lights[name] = {"id": id_, "positions": positions}
+    def get_predict(self) -> Dict[str, Any]:
+        """Optional latency compensation settings, empty dict means no prediction."""
+        _ret = self._config_data.get("predict") or {}
+        assert isinstance(_ret, dict)
+        return _ret
 
-        assert isinstance(lights, dict)
-        return lights
+    def get_color(self) -> Dict[str, Any]:
+        """Optional color conversion settings, empty dict means RGB streaming."""
+        _ret = self._config_data.get("color") or {}
+        assert isinstance(_ret, dict)
+        return _ret
+
+    def get_geometry(self) -> Dict[str, Any]:
+        """Optional screen geometry for lights with a location, empty dict means 16:9 defaults."""
+        _ret = self._config_data.get("geometry") or {}
+        assert isinstance(_ret, dict)
+        return _ret
+
+    def get_cache_dir(self) -> str:
+        """Directory for data computed once and reused after restart."""
+        return str(self._config_data.get("cache_dir", ".cache"))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Optional metrics endpoint settings, disabled by default."""
+        _ret = self._config_data.get("metrics") or {}
+        assert isinstance(_ret, dict)
+        return _ret
+
+    def get_reload(self) -> Dict[str, Any]:
+        """Optional config file watching settings, the file is watched by default."""
+        _ret = self._config_data.get("reload") or {}
+        assert isinstance(_ret, dict)
+        return _ret
+
+    def get_lights_setup(self) -> List[LightSpec]:
+        """Parsed lights, see `parse_lights_setup` for supported forms."""
+        _ret = self._config_data.get("lights_setup")
+        assert isinstance(_ret, (dict, list)), "lights_setup is missing"
+        return parse_lights_setup(_ret)
 
     def get_nested(self, *keys: str, default: Any = None) -> Any:
         """Access nested values, e.g. get_nested("db", "host")"""
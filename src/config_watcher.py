@@ -0,0 +1,55 @@
+"""Reload configuration while running.
+
+The config file is polled (one `stat` call per interval, no extra dependencies) and changes are
+reported to a callback in the watcher thread. The callback parses and compiles the new config
+there, the hot loop only swaps already prepared objects between two frames.
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigWatcher(threading.Thread):
+    """Call `on_change` when the file at `path` is modified."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        on_change: Callable[[], None],
+        interval_s: float = 1.0,
+    ) -> None:
+        super().__init__(name="config_watcher", daemon=True)
+        assert interval_s > 0, "interval_s must be positive"
+        self._path = Path(path)
+        self._on_change = on_change
+        self._interval_s = interval_s
+        self._stop_event = threading.Event()
+        self._signature = self._stat()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None  # file is being replaced
+        return stat.st_mtime_ns, stat.st_size
+
+    def run(self) -> None:
+        logger.info(f"Watching {self._path} for changes")
+        while not self._stop_event.wait(self._interval_s):
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                continue
+            self._signature = signature
+            logger.warning(f"{self._path} changed, reloading")
+            try:
+                self._on_change()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                logger.error(f"Reloading {self._path} failed, keeping current config: {err}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
@@ -0,0 +1,97 @@
+"""Screen geometry: physical LED coordinates and distance based light kernels.
+
+Coordinates are in the TV plane with the origin in the screen center, x to the right, y up and
+z towards the room, in any unit (lamp locations use the same one). LEDs of a side are spread
+evenly along its edge, in the order of the decoded frame: left bottom -> top, top left -> right,
+right top -> bottom.
+
+A lamp with a `location` gets a kernel instead of hand-picked positions: every LED is weighted by
+its distance from the lamp, relative to the closest LED, so `radius` is how far along the screen
+edges the lamp reaches. The kernel is computed once per TV layout and becomes a row of the
+LightMixer matrix, the frame loop cost does not change.
+"""
+
+import logging
+import math
+from typing import Any, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Layout = Tuple[int, int, int]  # number of LEDs: left, top, right
+Point = Tuple[float, float, float]
+
+_DEFAULTS: Dict[str, Any] = {
+    "width": 1.6,  # screen width, 16:9 by default
+    "height": 0.9,  # screen height
+    "falloff": "gaussian",  # "gaussian" or "inverse_square"
+    "radius": 0.4,  # distance beyond the closest LED where the weight drops to ~0.6 / 0.5
+    "min_weight": 0.05,  # LEDs weighted below this fraction of the closest LED are not used
+}
+
+
+def _gaussian(extra: float, radius: float) -> float:
+    return math.exp(-0.5 * (extra / radius) ** 2)
+
+
+def _inverse_square(extra: float, radius: float) -> float:
+    return 1.0 / (1.0 + (extra / radius) ** 2)
+
+
+_FALLOFFS = {"gaussian": _gaussian, "inverse_square": _inverse_square}
+
+
+class ScreenGeometry:
+    """Screen size and falloff shared by all lamps with a location.
+
+    Config example:
+        geometry:
+          width: 1.45
+          height: 0.82
+          falloff: "gaussian"
+          radius: 0.4
+    """
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        config = {**_DEFAULTS, **config}
+        assert config["falloff"] in _FALLOFFS, f"Unknown falloff: {config['falloff']}"
+        assert config["width"] > 0 and config["height"] > 0, "Screen size must be positive"
+        assert config["radius"] > 0, "radius must be positive"
+        assert 0 <= config["min_weight"] < 1, "min_weight must be in range [0, 1)"
+        self.width = float(config["width"])
+        self.height = float(config["height"])
+        self.radius = float(config["radius"])
+        self._falloff = _FALLOFFS[config["falloff"]]
+        self._min_weight = float(config["min_weight"])
+
+    def led_points(self, layout: Layout) -> List[Point]:
+        """Coordinates of every LED, in decoded frame order."""
+        half_w, half_h = self.width / 2, self.height / 2
+        left, top, right = layout
+        points: List[Point] = []
+        points += [
+            (-half_w, -half_h + (idx + 0.5) * self.height / left, 0.0) for idx in range(left)
+        ]
+        points += [(-half_w + (idx + 0.5) * self.width / top, half_h, 0.0) for idx in range(top)]
+        points += [
+            (half_w, half_h - (idx + 0.5) * self.height / right, 0.0) for idx in range(right)
+        ]
+        return points
+
+    def kernel(
+        self, location: Sequence[float], layout: Layout, radius: float = 0.0
+    ) -> Tuple[List[int], List[float]]:
+        """LED positions and normalized weights of a lamp at `location` (x, y[, z]).
+
+        `radius` overrides the radius of the geometry for this lamp.
+        """
+        assert len(location) in (2, 3), f"Location needs x, y and optional z: {location}"
+        assert sum(layout) > 0, "TV has no LEDs"
+        lamp = (float(location[0]), float(location[1]), float(location[2] if location[2:] else 0))
+        radius = radius or self.radius
+        distances = [math.dist(lamp, point) for point in self.led_points(layout)]
+        closest = min(distances)
+        weights = [self._falloff(distance - closest, radius) for distance in distances]
+
+        positions = [pos for pos, weight in enumerate(weights) if weight >= self._min_weight]
+        total = sum(weights[pos] for pos in positions)
+        return positions, [weights[pos] / total for pos in positions]
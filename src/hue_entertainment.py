@@ -3,34 +3,62 @@
 https://github.com/hrdasdominik/hue-entertainment-pykit/blob/main/src/hue_entertainment_pykit.py
 """
 
+import hashlib
+import json
 import logging
+import os
+import threading
 import time
-from typing import Any, Dict, Tuple
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
 
-from hue_entertainment_pykit import Streaming  # type: ignore  # missing some types
-from hue_entertainment_pykit import Discovery, Entertainment, create_bridge, setup_logs
+from hue_entertainment_pykit import EntertainmentConfiguration  # type: ignore  # missing some types
+from hue_entertainment_pykit import Discovery, Entertainment, Streaming, create_bridge
+
+from src.hue_stream import create_native_sender
 
 logger = logging.getLogger(__name__)
 
 
+def _route_pykit_logs() -> None:
+    """Route hue_entertainment_pykit logs through the handlers of ah_logger.
+
+    pykit's setup_logs adds synchronous console and file handlers and does not propagate, so its
+    records would bypass the log queue. Streaming.set_input logs every light of every frame at
+    INFO, so pykit logs below WARNING only with --loglevel DEBUG.
+    """
+    for noisy in ("urllib3", "requests", "zeroconf"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    pykit_logger = logging.getLogger("hue_entertainment_pykit")
+    for handler in list(pykit_logger.handlers):
+        pykit_logger.removeHandler(handler)
+        handler.close()
+    pykit_logger.propagate = True
+    debug = logging.getLogger().getEffectiveLevel() <= logging.DEBUG
+    pykit_logger.setLevel(logging.DEBUG if debug else logging.WARNING)
+
+
 class HueEntertainmentGroupKit:
 
-    def __init__(self, config: Dict[str, Any]) -> None:
+    def __init__(self, config: Dict[str, Any], cache_dir: Optional[str] = None) -> None:
         """Initialize the Hue Entertainment Group Kit.
 
         Args:
             config (Dict[str, Any]): Configuration dictionary containing the necessary parameters.
+            cache_dir (Optional[str]): Directory to cache the chosen Entertainment Configuration.
+                With a cached configuration streaming starts without fetching all configurations
+                from the bridge, the cache is validated in background.
 
         Based on official documentation:
         https://github.com/hrdasdominik/hue-entertainment-pykit?tab=readme-ov-file#streaming
         """
         assert isinstance(config, dict), "Configuration must be a dictionary."
+        self.index = config["index"]
 
-        # Initialize default logging
-        setup_logs()
-
-        # DEBUG and higher levels are active. ah_logger manages the root logging level.
-        setup_logs(level=logging.DEBUG)
+        # pykit logs go to the handlers of the root logger, see ah_logger.init_logger
+        _route_pykit_logs()
 
         # Set up the Bridge instance with the all needed configuration
         self._bridge = create_bridge(
@@ -45,51 +73,266 @@ class HueEntertainmentGroupKit:
         )
 
         # Set up the Entertainment API service
-        entertainment_service = Entertainment(self._bridge)
+        self._entertainment_service = Entertainment(self._bridge)
 
-        # Fetch all Entertainment Configurations on the Hue bridge
-        entertainment_configs = entertainment_service.get_entertainment_configs()
+        self.users = 1  # rooms streaming through this session
+        self._parked_by: Set[int] = set()  # rooms whose TV is off
+        self._park_lock = threading.Lock()
+        self._color_space = "rgb"
+        self._start_failed = False  # stream is down until `restart` succeeds
+        self.restart_cnt = 0
 
-        # Add choose Entertainment Area selection logic
-        entertainment_config = list(entertainment_configs.values())[config["index"]]
+        self._cache_path: Optional[Path] = None
+        if cache_dir:
+            key = f"{config['_ip_address']}|{config['_username']}|{self.index}"
+            name = f"hue_{hashlib.sha1(key.encode()).hexdigest()[:16]}.json"
+            self._cache_path = Path(cache_dir) / name
 
-        # Set up the Streaming service
-        self._streaming = Streaming(
-            self._bridge, entertainment_config, entertainment_service.get_ent_conf_repo()
-        )
+        cached_config = self._load_cached_config()
+        if cached_config is None:
+            self._start(config, self._fetch_config())
+            return
+
+        try:
+            self._start(config, cached_config)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.warning(f"Cached Entertainment Configuration failed ({err}), fetching it")
+            self._start(config, self._fetch_config())
+            return
+
+        threading.Thread(
+            target=self._validate_cache, args=(cached_config,), name="hue_cache", daemon=True
+        ).start()
+
+    def _start(self, config: Dict[str, Any], entertainment_config: Any) -> None:
+        self._config, self._entertainment_config = config, entertainment_config
+
+        # Set up the Streaming service: "pykit" queues every light, "native" sends one message with
+        # all lights per tick
+        self._native = config.get("sender", "pykit") == "native"
+        if self._native:
+            self._streaming = create_native_sender(
+                self._bridge,
+                entertainment_config,
+                self._entertainment_service.get_ent_conf_repo(),
+                config,
+            )
+        else:
+            self._streaming = Streaming(
+                self._bridge,
+                entertainment_config,
+                self._entertainment_service.get_ent_conf_repo(),
+            )
 
         # Start streaming messages to the bridge
         self._streaming.start_stream()
 
         # Set the color space to xyb or rgb
-        self._streaming.set_color_space("rgb")
+        self.set_color_space("rgb")
+
+    def _fetch_config(self) -> Any:
+        """Fetch all Entertainment Configurations on the Hue bridge and choose one by index."""
+        entertainment_configs = self._entertainment_service.get_entertainment_configs()
+        entertainment_config = list(entertainment_configs.values())[self.index]
+        self._save_cached_config(entertainment_config)
+        return entertainment_config
+
+    def _load_cached_config(self) -> Any:
+        if self._cache_path is None or not self._cache_path.exists():
+            return None
+        try:
+            with open(self._cache_path, encoding="utf-8") as file:
+                entertainment_config = EntertainmentConfiguration(json.load(file))
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            logger.warning(f"Ignoring invalid cache {self._cache_path}: {err}")
+            return None
+        logger.info(f"Using cached Entertainment Configuration {entertainment_config.name}")
+        return entertainment_config
+
+    def _save_cached_config(self, entertainment_config: Any) -> None:
+        if self._cache_path is None:
+            return
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._cache_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(entertainment_config.to_dict(), file)
+            os.replace(tmp_path, self._cache_path)
+        except OSError as err:
+            logger.warning(f"Entertainment Configuration not cached: {err}")
+
+    def _validate_cache(self, cached_config: Any) -> None:
+        """Compare cached configuration with the bridge, update cache when channels changed."""
+        try:
+            entertainment_configs = self._entertainment_service.get_entertainment_configs()
+            fresh_config = list(entertainment_configs.values())[self.index]
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.warning(f"Entertainment Configuration cache not validated: {err}")
+            return
+
+        fresh, cached = fresh_config.to_dict(), cached_config.to_dict()
+        if (fresh["id"], fresh["channels"]) != (cached["id"], cached["channels"]):
+            logger.warning("Entertainment Configuration changed on the bridge, restart to apply")
+        self._save_cached_config(fresh_config)
+
+    @property
+    def parked(self) -> bool:
+        return len(self._parked_by) >= self.users
+
+    @property
+    def failed(self) -> bool:
+        """Streaming is down until `restart`: the stream did not start or pykit gave up.
+
+        The native sender reconnects itself, it fails only when its thread died. pykit's
+        StreamingService tries 3 reconnects only, then it keeps running and just logs that it
+        gave up.
+        """
+        if self._start_failed:
+            return True
+        if self._native:
+            return self._streaming.failed
+        service = self._pykit_service()
+        return service is not None and getattr(service, "_reconnect_attempts", 0) >= 3
+
+    def _pykit_service(self) -> Any:
+        """StreamingService of the pykit sender, None for the native sender."""
+        return getattr(self._streaming, "_streaming_service", None)
+
+    def park(self, owner: int) -> None:
+        """Stop streaming for a room whose TV is off, the session stops when all rooms parked.
+
+        The Entertainment area is released, so the lights can be used by other apps meanwhile.
+        """
+        with self._park_lock:
+            was_parked = self.parked
+            self._parked_by.add(owner)
+            if self.parked and not was_parked:
+                logger.warning("All TVs are off, streaming parked")
+                if self._start_failed:
+                    return  # nothing is streaming
+                try:
+                    self._streaming.stop_stream()
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    logger.warning(f"Stopping the stream failed: {err}")
+
+    def resume(self, owner: int) -> None:
+        """Restart streaming for a room parked by `park`.
+
+        Raises when the bridge fails, the room then stays parked and can call `resume` again.
+        """
+        with self._park_lock:
+            if owner not in self._parked_by:
+                return
+            if self.parked:
+                logger.warning("TV is back, resuming streaming")
+                self._restart()
+            self._parked_by.discard(owner)
+
+    def restart(self) -> None:
+        """Start a new stream when `failed`, raises when the bridge fails."""
+        with self._park_lock:
+            if self.parked or not self.failed:
+                return  # restarted by another room meanwhile
+            logger.warning("Hue stream is down, restarting it")
+            service = self._pykit_service()
+            if service is not None and not self._start_failed:
+                # pykit gave up: end its threads without stop_stream, which would deactivate
+                # the Entertainment area the new stream is about to use
+                service._is_connection_alive = False  # pylint: disable=protected-access
+            elif self._native and not self._start_failed:
+                try:
+                    self._streaming.stop_stream()  # close the transport of the dead thread
+                except Exception as err:  # pylint: disable=broad-exception-caught  # broken
+                    logger.warning(f"Stopping the stream failed: {err}")
+            self._restart()
+            self.restart_cnt += 1
+
+    def _restart(self) -> None:
+        """Start a new stream with the current color space, stopped threads are gone."""
+        color_space = self._color_space
+        try:
+            self._start(self._config, self._entertainment_config)
+            self.set_color_space(color_space)
+        except Exception:
+            self._start_failed = True
+            raise
+        self._start_failed = False
+
+    def check_channels(self, channel_ids: Iterable[int]) -> None:
+        """Raise ValueError when a light uses a channel missing in the Entertainment area."""
+        known = {channel.channel_id for channel in self._entertainment_config.channels}
+        unknown = sorted(set(channel_ids) - known)
+        if unknown:
+            raise ValueError(
+                f"Channels {unknown} are not in Entertainment area "
+                f"{self._entertainment_config.name}, it has channels {sorted(known)}"
+            )
+
+    def set_color_space(self, value: str) -> None:
+        """Set "rgb" (RGB8 colors) or "xyb" (x, y, brightness 0.0-1.0 colors)."""
+        self._color_space = value
+        self._streaming.set_color_space(value)
 
     def set_color(
         self,
         light_id: int,
-        color: Tuple[int, int, int],
+        color: Tuple[float, float, float],
     ) -> None:
         """Set given light to given color.
 
         Args:
             light_id (int): light ID inside the Entertainment API
-            color (Tuple[int, int, int]): tuple for the color RGB8(int)
+            color (Tuple[float, float, float]): RGB8 (int) or xyb (float), see set_color_space
         """
         self._streaming.set_input((*color, light_id))
 
     def __del__(self) -> None:
-        logger.warning("Stop streaming in 10s ...")
+        logger.warning("Stop streaming ...")
+        if self.parked or self._start_failed:
+            return  # already stopped
 
-        # For the purpose of example sleep is used for all inputs to process before stop_stream is
-        # called
-        # Inputs are set inside Event queue meaning they're on another thread so user can interact
-        # with application continuously
-        time.sleep(0.1)
+        if not self._native:
+            # For the purpose of example sleep is used for all inputs to process before
+            # stop_stream is called
+            # Inputs are set inside Event queue meaning they're on another thread so user can
+            # interact with application continuously
+            time.sleep(0.1)
 
         # Stop the streaming session
         self._streaming.stop_stream()
 
 
+_SESSIONS: "weakref.WeakValueDictionary[Tuple[str, str], HueEntertainmentGroupKit]" = (
+    weakref.WeakValueDictionary()
+)
+_SESSIONS_LOCK = threading.Lock()
+
+
+def create_hue_entertainment(
+    config: Dict[str, Any], cache_dir: Optional[str] = None
+) -> HueEntertainmentGroupKit:
+    """Return streaming session of the bridge, shared by all rooms using the same bridge.
+
+    A bridge streams only one Entertainment area at a time, so rooms on one bridge must use the
+    same area (with different lights) and share its DTLS session.
+    """
+    key = (config["_ip_address"], config["_username"])
+    with _SESSIONS_LOCK:
+        kit = _SESSIONS.get(key)
+        if kit is None:
+            kit = HueEntertainmentGroupKit(config, cache_dir)
+            _SESSIONS[key] = kit
+        elif kit.index != config["index"]:
+            raise ValueError(
+                f"Bridge {key[0]} already streams Entertainment area {kit.index}, "
+                f"only one area per bridge can be active"
+            )
+        else:
+            kit.users += 1
+            logger.info(f"Reusing streaming session of bridge {key[0]}")
+        return kit
+
+
 def detect_hue_entertainment() -> None:
     """Detect Hue Entertainment configuration."""
     print("Get ready to click Hue Bridge button. Sleeping for 5 seconds...")
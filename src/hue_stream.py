@@ -0,0 +1,286 @@
+"""Native HueStream v2 sender.
+
+hue_entertainment_pykit queues every `set_input` call and sends one light per message from another
+thread. This sender keeps the latest color of every channel in a single preallocated HueStream v2
+message and writes the whole message to the socket at a fixed rate, so one packet carries the
+complete frame and nothing is ever queued.
+
+Message format (Entertainment API v2):
+    "HueStream" | version 0x02 0x00 | sequence | 0x00 0x00 | color space | 0x00 |
+    entertainment configuration id (36 ASCII chars) | per channel: id, R/x, G/y, B/bri (uint16 BE)
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from hue_entertainment_pykit.models.payload import Payload  # type: ignore  # missing some types
+from hue_entertainment_pykit.network.dtls import Dtls  # type: ignore  # missing some types
+
+from src.pipeline import FixedRateTimer
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL = b"HueStream\x02\x00"
+COLOR_SPACES = {"rgb": 0, "xyb": 1}
+MAX_CHANNELS = 20  # Entertainment API limit per configuration
+_HEADER_SIZE = 52  # protocol, sequence, reserved, color space, reserved, configuration id
+_CHANNEL = struct.Struct(">BHHH")
+_SEQUENCE_OFFSET = 11
+_COLOR_SPACE_OFFSET = 14
+
+
+class Transport(Protocol):
+    """Datagram socket the messages are written to."""
+
+    def open(self) -> None: ...
+
+    def send(self, data: bytes) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class UdpTransport:
+    """Plain UDP, e.g. for a local stand-in of the bridge."""
+
+    def __init__(self, host: str, port: int = 2100) -> None:
+        self._address = (host, port)
+        self._socket: Optional[socket.socket] = None
+
+    def open(self) -> None:
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.connect(self._address)
+
+    def send(self, data: bytes) -> None:
+        assert self._socket is not None, "Transport is not open"
+        self._socket.send(data)
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class DtlsTransport:
+    """DTLS (PSK) session with the Hue bridge, handshake is done by hue_entertainment_pykit.
+
+    Opening the transport activates the Entertainment Configuration on the bridge, closing it
+    deactivates the configuration again.
+    """
+
+    def __init__(self, dtls: Any, repository: Any, entertainment_id: str) -> None:
+        self._dtls = dtls
+        self._repository = repository
+        self._entertainment_id = entertainment_id
+
+    def open(self) -> None:
+        self._repository.put_configuration(self._payload("start"))
+        self._dtls.do_handshake()
+
+    def send(self, data: bytes) -> None:
+        self._dtls.get_socket().send(data)
+
+    def close(self) -> None:
+        self._dtls.close_socket()
+        self._repository.put_configuration(self._payload("stop"))
+
+    def _payload(self, action: str) -> Any:
+        return (
+            Payload()
+            .set_key_and_or_value("id", self._entertainment_id)
+            .set_key_and_or_value("action", action)
+        )
+
+
+class HueStreamSender:
+    """Stream the latest color of all channels at a fixed rate, one message per tick.
+
+    Unchanged state is repeated every `stream_resend_s` seconds, so a lost UDP packet is corrected
+    soon and the bridge does not close the idle session. When sending fails, the transport is
+    reopened with a backoff of 0.5 s doubling up to 10 s.
+
+    API mirrors hue_entertainment_pykit `Streaming`: start_stream, set_color_space, set_input,
+    stop_stream.
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        entertainment_id: str,
+        channel_ids: List[int],
+        config: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Args:
+        transport: socket to write messages to
+        entertainment_id: 36 characters id of the Entertainment Configuration
+        channel_ids: channels of the Entertainment Configuration, all are sent in every message
+        config: "stream_rate_hz" maximum messages per second (the bridge forwards ~25 updates
+            per second), "stream_resend_s" repeat unchanged state after this time
+        """
+        config = config or {}
+        assert len(entertainment_id) == 36, f"Invalid entertainment id: {entertainment_id}"
+        assert 0 < len(channel_ids) <= MAX_CHANNELS, f"1..{MAX_CHANNELS} channels are supported"
+        self._transport = transport
+        self._entertainment_id = entertainment_id
+        self._rate_hz = float(config.get("stream_rate_hz", 50))
+        self._resend_s = float(config.get("stream_resend_s", 0.5))
+
+        self._message = bytearray(_HEADER_SIZE + _CHANNEL.size * len(channel_ids))
+        self._message[: len(PROTOCOL)] = PROTOCOL
+        self._message[16:_HEADER_SIZE] = entertainment_id.encode("ascii")
+        self._offsets = {}  # channel id -> offset of its data in the message
+        for idx, channel_id in enumerate(channel_ids):
+            offset = _HEADER_SIZE + _CHANNEL.size * idx
+            self._offsets[channel_id] = offset
+            _CHANNEL.pack_into(self._message, offset, channel_id, 0, 0, 0)
+
+        self._color_space = "rgb"
+        self._lock = threading.Lock()
+        self._changed = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._broken = False  # send failed, transport is reopened with backoff
+        self.sent_cnt = 0
+        self.send_errors = 0
+        self.reconnect_cnt = 0
+
+    @property
+    def is_stream_active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def failed(self) -> bool:
+        """True when the sending thread died without `stop_stream`."""
+        return self._thread is not None and not self._thread.is_alive()
+
+    def start_stream(self) -> None:
+        """Open the transport and start sending."""
+        self._transport.open()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="hue_stream", daemon=True)
+        self._thread.start()
+        logger.info(f"Streaming {len(self._offsets)} channels at {self._rate_hz} Hz")
+
+    def stop_stream(self) -> None:
+        """Send the latest state and close the transport."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+        self._send()  # nothing pending is lost
+        self._transport.close()
+
+    def set_color_space(self, value: str) -> None:
+        """Set "rgb" (RGB8 inputs) or "xyb" (x, y and brightness 0.0-1.0 inputs)."""
+        assert value in COLOR_SPACES, f"Unknown color space: {value}"
+        with self._lock:
+            self._color_space = value
+            self._message[_COLOR_SPACE_OFFSET] = COLOR_SPACES[value]
+            self._changed = True
+
+    def set_input(self, user_input: Tuple[Any, Any, Any, int]) -> None:
+        """Same input as pykit Streaming: (r, g, b, channel_id) or (x, y, bri, channel_id)."""
+        *color, channel_id = user_input
+        self.set_color(channel_id, color)
+
+    def set_color(self, channel_id: int, color: Any) -> None:
+        """Update color of a single channel, it is sent with the next tick."""
+        offset = self._offsets.get(channel_id)
+        assert offset is not None, f"Channel {channel_id} is not in the Entertainment Configuration"
+        if self._color_space == "rgb":
+            first = min(255, max(0, int(color[0]))) * 257
+            second = min(255, max(0, int(color[1]))) * 257
+            third = min(255, max(0, int(color[2]))) * 257
+        else:
+            first = int(min(1.0, max(0.0, color[0])) * 65535)
+            second = int(min(1.0, max(0.0, color[1])) * 65535)
+            third = int(min(1.0, max(0.0, color[2])) * 65535)
+
+        with self._lock:
+            _CHANNEL.pack_into(self._message, offset, channel_id, first, second, third)
+            self._changed = True
+
+    def _send(self) -> None:
+        with self._lock:
+            self._message[_SEQUENCE_OFFSET] = self.sent_cnt & 0xFF
+            data = bytes(self._message)
+            self._changed = False
+        try:
+            self._transport.send(data)
+            self.sent_cnt += 1
+        except Exception as err:  # pylint: disable=broad-exception-caught  # e.g. mbedtls TLSError
+            self.send_errors += 1
+            self._broken = True
+            logger.error(f"Sending HueStream message failed: {err}")
+
+    def _reconnect(self) -> bool:
+        """Reopen the transport (new DTLS handshake), return True on success."""
+        try:
+            self._transport.close()
+        except Exception as err:  # pylint: disable=broad-exception-caught  # already broken
+            logger.debug(f"Closing broken transport failed: {err}")
+        try:
+            self._transport.open()
+        except Exception as err:  # pylint: disable=broad-exception-caught  # retried later
+            logger.warning(f"HueStream reconnect failed: {err}")
+            return False
+        self._broken = False
+        self.reconnect_cnt += 1
+        logger.warning("HueStream reconnected")
+        return True
+
+    def _run(self) -> None:
+        try:
+            self._send_loop()
+        except Exception:  # pylint: disable=broad-exception-caught  # reported by `failed`
+            logger.exception("HueStream sender stopped")
+
+    def _send_loop(self) -> None:
+        timer = FixedRateTimer(self._rate_hz)
+        last_sent = 0.0
+        backoff_s, retry_at = 0.5, 0.0
+        while not self._stop_event.is_set():
+            timer.wait()
+            now = time.monotonic()
+            if self._broken:
+                if now < retry_at:
+                    continue
+                if not self._reconnect():
+                    retry_at, backoff_s = now + backoff_s, min(backoff_s * 2, 10.0)
+                    continue
+                backoff_s = 0.5
+                self._changed = True  # latest state is sent right away
+            if self._changed or now - last_sent >= self._resend_s:
+                self._send()
+                last_sent = now
+
+
+TRANSPORTS = ("dtls", "udp")
+
+
+def create_native_sender(
+    bridge: Any, entertainment_config: Any, repository: Any, config: Dict[str, Any]
+) -> HueStreamSender:
+    """Native sender for an Entertainment Configuration fetched by hue_entertainment_pykit.
+
+    `stream_transport: "udp"` sends plain UDP to `stream_udp_address` ("host" or "host:port",
+    default the bridge at port 2100) instead of DTLS, e.g. to a local stand-in of the bridge.
+    """
+    name = config.get("stream_transport", "dtls")
+    assert name in TRANSPORTS, f"Unknown stream transport: {name}"
+    transport: Transport
+    if name == "udp":
+        host, _, port = str(config.get("stream_udp_address", config["_ip_address"])).partition(":")
+        transport = UdpTransport(host, int(port or 2100))
+    else:
+        transport = DtlsTransport(Dtls(bridge), repository, entertainment_config.id)
+    return HueStreamSender(
+        transport,
+        entertainment_config.id,
+        [channel.channel_id for channel in entertainment_config.channels],
+        config,
+    )
@@ -0,0 +1,219 @@
+"""Light setup parsing and compilation into a flat light map.
+
+Every light (or every segment of a gradient light) is one Entertainment channel. Positions can be
+given as:
+- LED index of the whole frame: `5`
+- range of indexes, inclusive: `"3-6"`
+- whole TV side: `"top"`
+- LEDs of a TV side, numbered as in README positions table: `"left 0"`, `"top 3-6"`
+
+Instead of positions a light may have a `location` in front of or behind the TV, its LEDs and
+weights are then derived from the screen geometry (see `geometry.py`).
+
+Side selectors depend on the TV layout, so lights are parsed at startup and compiled to plain LED
+indexes when the layout is known (first frame, or when the TV reports a different layout).
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from src.geometry import ScreenGeometry
+from src.tv_decoder import SIDES
+
+logger = logging.getLogger(__name__)
+
+Layout = Tuple[int, int, int]  # number of LEDs: left, top, right
+
+_SELECTOR_RE = re.compile(r"^\s*(?:(left|top|right)\s*)?(?:(\d+)\s*(?:[-–]\s*(\d+))?)?\s*$")
+
+
+class PositionSelector(NamedTuple):
+    """`side` None = index of the whole frame, `first` None = whole side."""
+
+    side: Optional[str]
+    first: Optional[int]
+    last: Optional[int]
+
+    def resolve(self, layout: Layout) -> List[int]:
+        """LED indexes in the decoded frame (left, top, right)."""
+        if self.side is None:
+            assert self.first is not None and self.last is not None
+            step = 1 if self.last >= self.first else -1
+            return list(range(self.first, self.last + step, step))
+
+        side_idx = SIDES.index(self.side)
+        count = layout[side_idx]
+        first, last = (0, count - 1) if self.first is None else (self.first, self.last)
+        assert first is not None and last is not None
+        assert max(first, last) < count, f"{self} is out of bounds, TV has {count} LEDs there"
+
+        step = 1 if last >= first else -1
+        offset = sum(layout[:side_idx])
+        return [offset + idx for idx in range(first, last + step, step)]
+
+
+def parse_position(position: Union[int, str]) -> PositionSelector:
+    if isinstance(position, int):
+        assert position >= 0, f"Position must not be negative: {position}"
+        return PositionSelector(None, position, position)
+
+    match = _SELECTOR_RE.match(str(position))
+    assert match and (match.group(1) or match.group(2)), f"Invalid position: {position!r}"
+    side, first, last = match.groups()
+    if first is None:
+        return PositionSelector(side, None, None)
+    return PositionSelector(side, int(first), int(last if last is not None else first))
+
+
+class LightSpec(NamedTuple):
+    """One Entertainment channel as configured, `name` of a segment is "light/index".
+
+    A light with `location` (x, y, z) has no positions, they are computed from the geometry.
+    """
+
+    name: str
+    channel_id: int
+    positions: Tuple[PositionSelector, ...]
+    weights: Optional[Tuple[float, ...]]
+    location: Optional[Tuple[float, ...]] = None
+    radius: float = 0.0  # kernel radius of a located light, 0 = radius of the geometry
+
+    def resolve(
+        self, layout: Layout, geometry: Optional[ScreenGeometry] = None
+    ) -> Tuple[List[int], Optional[List[float]]]:
+        """LED indexes and weights (None = configured ones) for the TV layout."""
+        if self.location is not None:
+            return (geometry or ScreenGeometry({})).kernel(self.location, layout, self.radius)
+        return [pos for selector in self.positions for pos in selector.resolve(layout)], None
+
+
+def _light_spec(name: str, data: Dict[str, Any]) -> LightSpec:
+    assert isinstance(data.get("id"), int), f"Light {name}: id must be an integer"
+    location = data.get("location")
+    if location:
+        assert len(location) in (2, 3), f"Light {name}: location needs x, y and optional z"
+        if data.get("positions"):
+            logger.info(f"Light {name} has a location, its positions are not used")
+        radius = float(data.get("radius") or 0.0)
+        assert radius >= 0, f"Light {name}: radius must not be negative"
+        return LightSpec(
+            name, data["id"], (), None, tuple(float(value) for value in location), radius
+        )
+
+    positions = data.get("positions")
+    assert positions, f"Light {name} has no positions or location"
+    if not isinstance(positions, list):
+        positions = [positions]
+    weights = data.get("weights")
+    if weights:
+        assert all(weight >= 0 for weight in weights), f"Light {name}: negative weight"
+        assert sum(weights) > 0, f"Light {name}: weights sum must be positive"
+    return LightSpec(
+        name,
+        data["id"],
+        tuple(parse_position(position) for position in positions),
+        tuple(float(weight) for weight in weights) if weights else None,
+    )
+
+
+def _light_specs(name: str, data: Dict[str, Any]) -> List[LightSpec]:
+    segments = data.get("segments")
+    if not segments:
+        return [_light_spec(name, data)]
+    return [_light_spec(f"{name}/{idx}", segment) for idx, segment in enumerate(segments)]
+
+
+def light_overrides(name: str, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Per light settings of a stage (its `lights` section) for light `name`.
+
+    Segments ("strip/0") use overrides of their light ("strip") unless they have their own.
+    """
+    found: Dict[str, Any] = overrides.get(name, overrides.get(name.split("/")[0], {}))
+    return found
+
+
+def parse_lights_setup(
+    lights_setup: Union[Dict[str, Any], List[Dict[str, Any]]],
+) -> List[LightSpec]:
+    """Parse `lights_setup` config section.
+
+    Supported forms:
+    - prefixed keys: `A_name`, `A_id`, `A_positions`, `A_weights` (any prefix, any number)
+    - mapping: `sofa: {id: 0, positions: [...], weights: [...]}`
+    - list: `- {name: sofa, id: 0, positions: [...]}`, a light may have `segments` instead of
+      `id`/`positions`, every segment being a `{id, positions, weights}` channel
+    """
+    lights: List[LightSpec] = []
+    if isinstance(lights_setup, list):
+        for light in lights_setup:
+            assert isinstance(light, dict) and light.get("name"), f"Light without name: {light}"
+            lights += _light_specs(str(light["name"]), light)
+    else:
+        assert isinstance(lights_setup, dict), "lights_setup must be a mapping or a list"
+        for key, value in lights_setup.items():
+            if isinstance(value, dict):
+                lights += _light_specs(str(key), value)
+            elif key.endswith("_name") and value is not None:
+                prefix = key[: -len("name")]
+                lights += _light_specs(
+                    str(value),
+                    {
+                        field: lights_setup.get(prefix + field)
+                        for field in (
+                            "id",
+                            "positions",
+                            "weights",
+                            "segments",
+                            "location",
+                            "radius",
+                        )
+                    },
+                )
+
+    names = [light.name for light in lights]
+    assert len(set(names)) == len(names), f"Light names must be unique: {names}"
+    channel_ids = [light.channel_id for light in lights]
+    if len(set(channel_ids)) != len(channel_ids):
+        logger.warning(f"Several lights use the same channel: {channel_ids}")
+    return lights
+
+
+def used_sides(
+    lights: List[LightSpec], layout: Layout, geometry: Optional[ScreenGeometry] = None
+) -> Tuple[str, ...]:
+    """TV sides with at least one LED used by `lights`, in SIDES order."""
+    ends = [sum(layout[: idx + 1]) for idx in range(len(SIDES))]
+    used = set()
+    for light in lights:
+        for pos in light.resolve(layout, geometry)[0]:
+            used.add(next((idx for idx, end in enumerate(ends) if pos < end), len(SIDES) - 1))
+    return tuple(side for idx, side in enumerate(SIDES) if idx in used)
+
+
+class LightMap:
+    """Lights compiled for a TV layout: plain LED indexes and normalized weights per channel."""
+
+    def __init__(
+        self,
+        lights: List[LightSpec],
+        layout: Layout,
+        geometry: Optional[ScreenGeometry] = None,
+    ) -> None:
+        num_of_leds = sum(layout)
+        self.layout = layout
+        self.positions: List[Tuple[int, ...]] = []
+        self.weights: List[Tuple[float, ...]] = []
+
+        for light in lights:
+            positions, kernel = light.resolve(layout, geometry)
+            weights = kernel or light.weights or (1.0,) * len(positions)
+            assert len(weights) == len(
+                positions
+            ), f"Light {light.name}: {len(weights)} weights for {len(positions)} positions"
+            assert all(
+                pos < num_of_leds for pos in positions
+            ), f"Light {light.name}: positions are out of bounds, TV has {num_of_leds} LEDs"
+            total = sum(weights)
+            self.positions.append(tuple(positions))
+            self.weights.append(tuple(weight / total for weight in weights))
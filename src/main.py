@@ -1,106 +1,667 @@
+import gc
 import logging
-import sys
+import threading
 import time
-from json import JSONDecodeError
 from pathlib import Path
-from time import sleep
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
-from src.ambilight_tv import AmbilightTV  # TODO install
-from src.color_mixer import ColorMixer
+from src.ah_logger import ColorSummary
+from src.ambilight_tv import AmbilightTV, TvFrame, create_ambilight_tv  # TODO install
+from src.color_engine import ColorEngine
+from src.color_filter import ColorFilter
+from src.color_mixer import ColorMixer, LightMixer
 from src.config_loader import ConfigLoader
-from src.hue_entertainment import HueEntertainmentGroupKit, detect_hue_entertainment
+from src.config_watcher import ConfigWatcher
+from src.geometry import ScreenGeometry
+from src.hue_entertainment import (
+    HueEntertainmentGroupKit,
+    create_hue_entertainment,
+    detect_hue_entertainment,
+)
+from src.light_map import LightSpec, used_sides
+from src.metrics import Metrics, MetricsServer
+from src.pipeline import (
+    FixedRateTimer,
+    LatestFrameSlot,
+    PollScheduler,
+    ProducerThread,
+    RestartBackoff,
+)
+from src.predictor import ColorPredictor, LatencyEstimator
+from src.recording import RecordingReader, RecordingWriter
+from src.tv_decoder import SIDES, AmbilightDecoder
+from src.tv_process import RingFrame, TvReaderProcess
 
 logger = logging.getLogger(__name__)
 
+# Sections used by live connections and threads, changes are applied after restart only
+RESTART_SECTIONS = ("ambilight_tv", "hue_entertainment_group", "pipeline", "metrics", "cache_dir")
+
+
+class FrameStages(NamedTuple):
+    """Per-frame processing built from config, replaced as a whole on config reload."""
+
+    lights: List[LightSpec]
+    light_mixer: LightMixer
+    filter: ColorFilter
+    predictor: ColorPredictor
+    color_engine: Optional[ColorEngine]
+
 
 class AmbiHueMain:
     """Main class to run the AmbiHue application."""
 
-    def __init__(self, config_path: Union[str, Path] = "userconfig.yaml") -> None:
-        """Initialize the AmbiHue main class."""
-        self._config_loader = ConfigLoader(config_path)
+    def __init__(
+        self, config_path: Union[str, Path] = "userconfig.yaml", room: Optional[ConfigLoader] = None
+    ) -> None:
+        """Initialize the AmbiHue main class, `room` = configuration of one of several rooms."""
+        self._config_loader = room or ConfigLoader(config_path)
+        self._config_path = Path(config_path) if room is None else None
+        self.name = self._config_loader.get_name()
 
-        self._tv = AmbilightTV(self._config_loader.get_ambilight_tv())
-        self._hue = HueEntertainmentGroupKit(self._config_loader.get_hue_entertainment())
+        self._tv = self._create_tv(self._config_loader.get_ambilight_tv())
+        self._hue = self._create_hue(self._config_loader.get_hue_entertainment())
         self._mixer = ColorMixer()
-
-        self._light_setup = self._config_loader.get_lights_setup()
+        self._decoder = AmbilightDecoder(
+            backend=self._config_loader.get_ambilight_tv().get("decoder", "auto")
+        )
+
+        self._pipeline_config = self._config_loader.get_pipeline()
+        self._narrow_fetch = self._config_loader.get_ambilight_tv().get("narrow_fetch", True)
+        self._full_tv_path = self._tv.path
+        self._fetch_layout: Optional[Tuple[int, int, int]] = None  # layout the fetch is narrowed to
+        self._narrowed_at = 0.0  # time the TV path was narrowed, 0 = path is verified
+        self._latency = LatencyEstimator(self._config_loader.get_predict())
+        stages = self._create_stages(self._config_loader)
+        self._lights, self._light_mixer, self._filter, self._predictor, self._color_engine = stages
+        self._color_summary = self._create_color_summary(self._lights)
+        if self._color_engine:
+            self._hue.set_color_space("xyb")
+        self._reloads: LatestFrameSlot[FrameStages] = LatestFrameSlot()  # swapped between frames
 
         self._tv_error_cnt = 0
-
-        self._previous_time = time.time()
-
-    def _read_tv(self) -> Optional[Dict[str, Any]]:
+        self._tv_down_since: Optional[float] = None
+        self._park_after_s = float(self._pipeline_config.get("park_after_s", 300))
+        self._hue_parked = False
+        self._hue_restart = RestartBackoff("Hue stream")
+        self._hue_down = False  # resuming or restarting the Hue stream failed, retried later
+        self._reader_restarts = 0
+        self._stop_event = threading.Event()
+        self._scheduler = PollScheduler(self._pipeline_config, self._stop_event)
+        self._tv.set_scheduler(self._scheduler)  # idle rate and backoff also pace async requests
+        self._last_tv_data = b""  # body of the last frame read by the poll scheduler
+        self._last_processed = b""  # last frame mixed and sent to Hue
+        self._unchanged_frames = 0
+
+        self.metrics = self._create_metrics()
+        self._frame_slot: Optional[LatestFrameSlot[TvFrame]] = None
+        self._tv_reader: Optional[TvReaderProcess] = None  # multiprocess mode
+        self.recorder: Optional[RecordingWriter] = None  # set to record decoded frames
+
+        metrics_config = self._config_loader.get_metrics()
+        self._metrics_server: Optional[MetricsServer] = None
+        if metrics_config.get("enabled", False):
+            self._metrics_server = MetricsServer(
+                self.metrics,
+                metrics_config.get("port", 8080),
+                reload=self.reload_config if self._config_path else None,
+            )
+
+    def _create_metrics(self) -> Metrics:
+        """Stage histograms with gauges of the counters of this room."""
+        metrics = Metrics()
+        metrics.gauge("tv_errors", lambda: self._tv_error_cnt)
+        metrics.gauge("suppressed_updates", lambda: self._filter.suppressed_cnt)
+        metrics.gauge("dropped_frames", lambda: self._dropped_frames)
+        metrics.gauge("unchanged_frames", lambda: self._unchanged_frames)
+        metrics.gauge("mixed_lights", lambda: self._light_mixer.recomputed_cnt)
+        metrics.gauge("poll_rate", lambda: 1 / self._scheduler.period)
+        metrics.gauge("tv_reconnects", self._tv_reconnects)
+        metrics.gauge("reader_restarts", lambda: self._reader_restarts)
+        metrics.gauge("hue_parked", lambda: int(self._hue_parked))
+        metrics.gauge("hue_restarts", lambda: getattr(self._hue, "restart_cnt", 0))
+        metrics.gauge("tv_latency_ms", lambda: self._latency.tv_latency_s * 1000)
+        metrics.gauge("frame_age_ms", lambda: self._latency.horizon_s * 1000)
+        metrics.gauge("gc_collections", lambda: sum(gen["collections"] for gen in gc.get_stats()))
+        return metrics
+
+    def _create_stages(self, config_loader: ConfigLoader) -> FrameStages:
+        """Parse and compile everything a frame needs from config, may take a while."""
+        lights = config_loader.get_lights_setup()
+        self._hue.check_channels(light.channel_id for light in lights)  # not in the frame loop
+        names = [light.name for light in lights]
+        color_config = config_loader.get_color()
+        assert color_config.get("mode", "rgb") in ("rgb", "xyb"), "color mode: rgb or xyb"
+        color_engine = None
+        if color_config.get("mode", "rgb") == "xyb":
+            color_engine = ColorEngine(names, color_config, config_loader.get_cache_dir())
+
+        return FrameStages(
+            lights,
+            LightMixer(
+                lights,
+                backend=self._pipeline_config.get("mixer", "auto"),
+                geometry=ScreenGeometry(config_loader.get_geometry()),
+            ),
+            ColorFilter(names, config_loader.get_filter()),
+            ColorPredictor(names, config_loader.get_predict()),
+            color_engine,
+        )
+
+    def _use_stages(self, stages: FrameStages) -> None:
+        """Switch to new stages, called between frames."""
+        if (stages.color_engine is None) != (self._color_engine is None):
+            self._hue.set_color_space("rgb" if stages.color_engine is None else "xyb")
+        stages.filter.suppressed_cnt = self._filter.suppressed_cnt  # counters keep counting
+        stages.light_mixer.recomputed_cnt = self._light_mixer.recomputed_cnt
+        self._lights = stages.lights
+        self._color_summary = self._create_color_summary(stages.lights)
+        self._fetch_layout = None  # lights may use other sides now
+        self._light_mixer = stages.light_mixer
+        self._filter = stages.filter
+        self._predictor = stages.predictor
+        self._color_engine = stages.color_engine
+
+    def reload_config(self, room: Optional[ConfigLoader] = None) -> None:
+        """Apply light setup, filter, predict and color changes without touching connections.
+
+        The config is parsed and compiled in the calling thread, the frame loop only swaps the
+        prepared stages before its next frame. `room` is the new configuration of this room,
+        None = load the config file again.
+        """
+        if room is None:
+            assert self._config_path, "Rooms are reloaded by MultiRoomMain"
+            room = ConfigLoader.from_file(self._config_path)
+        self.check_reload(room)
+        for section in RESTART_SECTIONS:
+            if room.get_nested(section) != self._config_loader.get_nested(section):
+                logger.warning(f"Config section {section} changed, restart to apply it")
+
+        stages = self._create_stages(room)
+        layout = self._light_mixer.layout
+        if layout:
+            stages.light_mixer.prepare(layout)  # no light map compilation in the frame loop
+        self._config_loader = room
+        self._reloads.put(stages)
+        logger.warning(f"Config of {self.name or 'AmbiHue'} reloaded: {len(stages.lights)} lights")
+
+    def check_reload(self, room: ConfigLoader) -> None:
+        """Refuse a color mode change while the stream of the bridge is shared with other rooms.
+
+        The color space is set for the whole stream, other rooms would send wrong colors.
+        """
+        mode = room.get_color().get("mode", "rgb")
+        if mode != self._config_loader.get_color().get("mode", "rgb") and self._hue.users > 1:
+            raise ValueError(
+                f"Color mode of {self.name} changed to {mode}, its bridge stream is shared "
+                f"with other rooms, restart to apply it"
+            )
+
+    def _apply_reload(self) -> bool:
+        """Switch to stages prepared by `reload_config`, return True when switched."""
+        stages = self._reloads.take()
+        if stages is None:
+            return False
+        self._use_stages(stages)
+        return True
+
+    def _create_color_summary(self, lights: List[LightSpec]) -> ColorSummary:
+        name = f"{self.name} " if self.name else ""
+        return ColorSummary(
+            logger,
+            [f"{name}{light.name}" for light in lights],
+            float(self._pipeline_config.get("log_interval_s", 1.0)),
+        )
+
+    def _create_tv(self, config: Dict[str, Any]) -> AmbilightTV:
+        return create_ambilight_tv(config)
+
+    def _create_hue(self, config: Dict[str, Any]) -> HueEntertainmentGroupKit:
+        return create_hue_entertainment(config, self._config_loader.get_cache_dir())
+
+    def _create_tv_reader(self) -> TvReaderProcess:
+        return TvReaderProcess(self._config_loader.get_ambilight_tv(), self._pipeline_config)
+
+    def _read_tv(self) -> Optional[TvFrame]:
         """Read the Ambilight TV data.
 
         If the TV is not reachable, return None.
 
         Returns:
-            Optional[Dict[str, Any]]: The JSON data from the TV or None if an error occurs.
+            Optional[TvFrame]: The raw JSON data from the TV with request timestamps or None if an
+                error occurs.
         """
+        started = time.perf_counter()
         try:
-            tv_data = self._tv.get_ambilight_json()
+            tv_frame = self._tv.get_ambilight_frame()
+            self.metrics.stages["fetch"].observe_since(started)
             self._tv_error_cnt = 0  # reset error count on success
-            return tv_data
-
-        except JSONDecodeError as err:
-            self._tv_error_cnt += 1
-            logger.error(f"Decoding JSON error: {err}")
+            return tv_frame
 
         except RuntimeError as err:
-            self._tv_error_cnt += 1
-            logger.error(f"Request error: {err}")
-
-        # Error handling for TV data
-        if self._tv_error_cnt > 10:
-            self._exit(10)  # exit if TV is not reachable for too long
+            self._count_tv_error(f"Request error: {err}")
 
         return None  # return None if an error occurs
 
-    def _debug_log_time(self, msg: str) -> None:
-        if logger.getEffectiveLevel() > logging.DEBUG:
-            return  # skip if debug logging is not enabled
-
-        current_time = time.time()
-        elapsed_time = int((current_time - self._previous_time) * 1000)  # convert to ms
-        logger.warning(f"[{msg}] elapsed time: {elapsed_time} ms")
-        self._previous_time = current_time
+    def _count_tv_error(self, msg: str) -> None:
+        self._tv_error_cnt += 1
+        logger.error(msg)
+
+    def _poll_tv(self) -> Optional[TvFrame]:
+        """Wait for the next poll deadline and read the TV. Adapt poll rate to the result."""
+        self._scheduler.wait()
+        if self._stop_event.is_set():
+            return None
+
+        tv_frame = self._read_tv()
+        if tv_frame is None:
+            self._scheduler.failed()  # exponential backoff, TV may be off
+            self._tv_failed()
+            if self._narrowed_at:
+                logger.warning(f"TV does not serve {self._tv.path}, using {self._full_tv_path}")
+                self._narrow_fetch = False
+                self._narrowed_at = 0.0
+                self._tv.set_path(self._full_tv_path)
+            return None
+
+        if self._narrowed_at and tv_frame.sent_at > self._narrowed_at:
+            self._narrowed_at = 0.0  # narrow path works
+        self._tv_down_since = None
+        self._latency.observe(tv_frame.sent_at, tv_frame.received_at)
+        self._scheduler.succeeded(changed=tv_frame.data != self._last_tv_data)
+        self._last_tv_data = tv_frame.data
+        return tv_frame
+
+    def _tv_failed(self) -> None:
+        """Park the Hue stream when the TV is off for `park_after_s`, 0 = never park."""
+        now = time.monotonic()
+        if self._tv_down_since is None:
+            self._tv_down_since = now
+        elif self._park_after_s and not self._hue_parked:
+            if now - self._tv_down_since >= self._park_after_s:
+                logger.warning(f"TV is off for {self._park_after_s:.0f}s, parking Hue stream")
+                self._hue.park(id(self))
+                self._hue_parked = True
+
+    def _restart_hue(self) -> bool:
+        """Resume the parked or restart the failed Hue stream, True when it runs.
+
+        A failed attempt is retried after 1 s, doubled after every next failure up to 30 s.
+        """
+        if self._hue_down and not self._hue_restart.due():
+            return False
+        try:
+            if self._hue_parked:
+                self._hue.resume(id(self))
+            else:
+                self._hue.restart()
+        except Exception as err:  # pylint: disable=broad-exception-caught  # bridge or network
+            logger.error(f"Hue stream not started: {err}")
+            self._hue_down = True
+            self._hue_restart.due()  # schedule the next attempt
+            return False
+        self._hue_parked = self._hue_down = False
+        self._hue_restart.reset()
+        self._filter.resend()  # the new stream has no colors yet, send all lights again
+        self._last_processed = b""
+        return True
+
+    @property
+    def _dropped_frames(self) -> int:
+        """Frames read from the TV but never sent to Hue."""
+        dropped = self._frame_slot.dropped if self._frame_slot else 0
+        if self._tv_reader:
+            dropped += self._tv_reader.ring.dropped
+        return dropped + getattr(self._tv, "stale_cnt", 0)
+
+    def _tv_reconnects(self) -> int:
+        if self._tv_reader:
+            return self._tv_reader.ring.stats()[1]
+        return getattr(self._tv, "reconnect_cnt", 0)
 
     def run(self) -> None:
         """Run the main loop of the AmbiHue application."""
-        self._tv.wait_for_startup()
-        logger.info("Starting AmbiHue application...")
-
-        while True:  # while true
-            sleep(0.01)
-            self._debug_log_time("sleep")
+        try:
+            if self._pipeline_config.get("mode") != "multiprocess":  # reader process waits itself
+                self._tv.wait_for_startup()
+        except RuntimeError as err:
+            logger.warning(f"{err}, polling until the TV is back")
+        logger.info(f"Starting AmbiHue application {self.name}...")
+        self.run_frames()
+
+    def run_frames(self) -> None:
+        """Process TV frames until `stop` is called. TV must be already running."""
+        if self._metrics_server:
+            self._metrics_server.start()
+        watcher = self._create_watcher()
+        # objects created at startup (config, light maps, color tables, clients) live until exit,
+        # garbage collections of the frame loop do not need to walk them again
+        gc.freeze()
 
-            tv_data = self._read_tv()
-            if tv_data is None:
+        try:
+            mode = self._pipeline_config.get("mode", "sequential")
+            if mode == "pipelined":
+                self._run_pipelined()
+            elif mode == "multiprocess":
+                self._run_multiprocess()
+            else:
+                self._run_sequential()
+        finally:
+            if watcher:
+                watcher.stop()
+            if self._metrics_server:
+                self._metrics_server.stop()
+            if self.recorder:
+                self.recorder.close()
+
+    def _create_watcher(self) -> Optional[ConfigWatcher]:
+        reload_config = self._config_loader.get_reload()
+        if not self._config_path or not reload_config.get("watch", True):
+            return None
+        watcher = ConfigWatcher(
+            self._config_path, self.reload_config, reload_config.get("interval_s", 1.0)
+        )
+        watcher.start()
+        return watcher
+
+    def replay(self, path: Union[str, Path], speed: float = 1.0) -> None:
+        """Send frames of a recording instead of reading the TV.
+
+        Args:
+            path: file written by RecordingWriter
+            speed: 1.0 = original timing, 2.0 = twice as fast, 0 = as fast as possible
+        """
+        with RecordingReader(path) as reader:
+            logger.info(f"Replaying {path} ({reader.layout} LEDs) at speed {speed}")
+            started = time.monotonic()
+            for timestamp, rgb in reader.frames():
+                if speed > 0:
+                    self._stop_event.wait(started + timestamp / speed - time.monotonic())
+                if self._stop_event.is_set():
+                    break
+                self._apply_reload()
+                if (self._hue_parked or self._hue.failed) and not self._restart_hue():
+                    continue  # nothing can be sent until the Hue stream runs again
+                self._process_frame(rgb, reader.layout, time.perf_counter(), time.monotonic())
+
+    def stop(self) -> None:
+        """Stop the frame loop, it is safe to call from another thread."""
+        self._stop_event.set()
+
+    def _run_sequential(self) -> None:
+        """Read, mix and send one frame after another on a single thread."""
+        while not self._stop_event.is_set():
+            tv_frame = self._poll_tv()
+            if tv_frame is None:
                 continue  # skip this loop if TV data is not available this time
-            self._debug_log_time("read_tv")
 
-            self._mixer.apply_tv_data(tv_data)
-            self._mixer.print_colors()
-            self._debug_log_time("print_colors")
+            self._process_tv_data(tv_frame)
 
-            for light_name, light_data in self._light_setup.items():
-                color = self._mixer.get_average_color(light_data["positions"])
-                self._hue.set_color(light_data["id"], color.get_tuple())
+    def _run_pipelined(self) -> None:
+        """Read the TV in a background stage, mix and send at a fixed rate on this thread.
 
-                print_color = color.get_css_color_name_colored()
-                logger.info(f"Light: {light_name} - {print_color} - {light_data} ")
+        A crashed reader stage is restarted after 1 s, doubled after every next crash up to 30 s.
+        Hue streaming keeps running meanwhile.
+        """
+        slot: LatestFrameSlot[TvFrame] = LatestFrameSlot()
+        self._frame_slot = slot
+        reader = ProducerThread(self._poll_tv, slot, name="tv_reader")
+        timer = FixedRateTimer(self._pipeline_config.get("hue_rate_hz", 50))
+        reader.start()
+        restart = RestartBackoff("TV reader")
+
+        try:
+            while not self._stop_event.is_set():
+                timer.wait()
+
+                if not reader.is_alive() and restart.due():
+                    reader = ProducerThread(self._poll_tv, slot, name="tv_reader")
+                    reader.start()
+                    self._reader_restarts += 1
+
+                tv_frame = slot.take()
+                if tv_frame is None:
+                    continue  # no new frame since the last tick
 
-            logger.info("\n\n")
-            self._debug_log_time("set_color_x_lights")
+                restart.reset()  # reader works again
+                self._process_tv_data(tv_frame)
+        finally:
+            reader.stop()
+
+    def _run_multiprocess(self) -> None:
+        """Read and decode the TV in a separate process, mix and send at a fixed rate here.
+
+        A crashed reader process is restarted like the reader stage of the pipelined mode.
+        """
+        reader = self._create_tv_reader()
+        self._tv_reader = reader
+        timer = FixedRateTimer(self._pipeline_config.get("hue_rate_hz", 50))
+        restart = RestartBackoff("TV reader process")
+        errors_in_row = 0
+        reader.start()
+
+        try:
+            while not self._stop_event.is_set():
+                timer.wait()
+
+                if not reader.is_alive() and restart.due():
+                    reader.start()
+                    self._reader_restarts += 1
+
+                frame = reader.ring.read()
+                if frame is None:
+                    # reader reports TV errors through the ring, count every new one once
+                    errors, _, _ = reader.ring.stats()
+                    if errors > errors_in_row:
+                        self._tv_error_cnt = errors
+                        self._tv_failed()
+                    errors_in_row = errors
+                    continue
+
+                restart.reset()
+                errors_in_row = self._tv_error_cnt = 0
+                self._process_shared_frame(frame)
+        finally:
+            self._tv_reader = None
+            reader.stop()
+
+    def _process_shared_frame(self, frame: RingFrame) -> None:
+        """Mix and send a frame decoded by the reader process."""
+        self._tv_down_since = None
+        self._latency.observe(frame.sent_at, frame.received_at)
+        if self._apply_reload():
+            frame = frame._replace(changed=True)  # new light setup, process even unchanged frame
+        if self._hue_parked or self._hue.failed:
+            if not self._restart_hue():
+                return  # nothing can be sent until the Hue stream runs again
+            frame = frame._replace(changed=True)  # the restarted stream has no colors yet
+        if not frame.changed and self._filter.settled:
+            self._unchanged_frames += 1
+            return
+
+        frame_started = time.perf_counter()
+        if self.recorder:
+            self.recorder.write(frame.rgb, frame.layout, time.monotonic())
+        captured_at = self._latency.captured_at(frame.received_at)
+        self._process_frame(frame.rgb, frame.layout, frame_started, captured_at)
+
+    def _process_tv_data(self, tv_frame: TvFrame) -> None:
+        """Mix TV colors for every light and send them to the Hue bridge."""
+        tv_data = tv_frame.data
+        if self._apply_reload():
+            self._last_processed = b""  # new light setup, process even an unchanged frame
+        if (self._hue_parked or self._hue.failed) and not self._restart_hue():
+            return  # nothing can be sent until the Hue stream runs again
+        if tv_data == self._last_processed and self._filter.settled:
+            self._unchanged_frames += 1  # byte-identical frame, lights are already up to date
+            return
+
+        stages = self.metrics.stages
+        frame_started = started = time.perf_counter()
+        try:
+            rgb = self._decoder.decode(tv_data)
+        except ValueError as err:
+            self._count_tv_error(f"Decoding JSON error: {err}")
+            return
+        stages["decode"].observe_since(started)
+        self._last_processed = tv_data
+        if self.recorder:
+            self.recorder.write(rgb, self._decoder.layout, time.monotonic())
+        elif self._narrow_fetch and self._fetch_layout != self._decoder.layout:
+            self._narrow_tv_request(self._decoder.layout)
+
+        captured_at = self._latency.captured_at(tv_frame.received_at)
+        self._process_frame(rgb, self._decoder.layout, frame_started, captured_at)
+
+    def _narrow_tv_request(self, layout: Tuple[int, int, int]) -> None:
+        """Fetch and parse only TV sides used by lights.
+
+        One side is requested from its own endpoint (`<path>/layer1/left`), several sides from the
+        layer endpoint (`<path>/layer1`). When the TV does not serve it, the full path is used
+        again and only the parsing is narrowed.
+        """
+        if self._fetch_layout is not None and self._decoder.sides != SIDES:
+            # TV layout changed while narrowed, LED counts of other sides are needed again
+            self._fetch_layout = None
+            self._decoder.set_sides(SIDES)
+            self._tv.set_path(self._full_tv_path)
+            return
+
+        self._fetch_layout = layout
+        sides = used_sides(self._lights, layout, self._light_mixer.geometry)
+        self._decoder.set_sides(sides)
+        layer_path = f"{self._full_tv_path}/{self._decoder.layer}"
+        path = f"{layer_path}/{sides[0]}" if len(sides) == 1 else layer_path
+        if path != self._tv.path:
+            logger.info(f"Lights use TV sides {', '.join(sides)}, requesting {path}")
+            self._tv.set_path(path)
+            # after set_path: frames sent later requested the narrowed path, also in pipelined mode
+            self._narrowed_at = time.monotonic()
+
+    def _process_frame(
+        self, rgb: Any, layout: Tuple[int, int, int], frame_started: float, captured_at: float
+    ) -> None:
+        """Mix decoded r/g/b LED bytes for every light and send them to the Hue bridge.
+
+        `captured_at` is the estimated time.monotonic() the TV showed the frame.
+        """
+        stages = self.metrics.stages
+        self._mixer.apply_tv_buffer(rgb, layout)
+        self._mixer.print_colors()
+
+        started = time.perf_counter()
+        mixed = self._light_mixer.mix(rgb, layout)
+        horizon_s = self._latency.horizon(captured_at, time.monotonic())
+        if self._predictor.enabled:
+            mixed = self._predictor.update(mixed, captured_at, horizon_s)
+        stages["mix"].observe_since(started)
+
+        started = time.perf_counter()
+        colors = self._filter.update(mixed, time.monotonic())
+        stages["filter"].observe_since(started)
+
+        started = time.perf_counter()
+        engine = self._color_engine
+        lights = self._lights
+        # plain range: no per-frame iterator objects counted by the garbage collector
+        for light_idx in range(len(lights)):  # pylint: disable=consider-using-enumerate
+            color_tuple = colors[light_idx]
+            if color_tuple is None:
+                continue  # color change below the threshold, keep the light as it is
+            if engine:
+                self._hue.set_color(
+                    lights[light_idx].channel_id, engine.convert(light_idx, color_tuple)
+                )
+            else:
+                self._hue.set_color(lights[light_idx].channel_id, color_tuple)
+        stages["send"].observe_since(started)
+
+        if logger.isEnabledFor(logging.INFO):  # CSS names and messages only when logged
+            self._color_summary.add(colors)
+        stages["frame"].observe_since(frame_started)
+        self.metrics.frame_done()
+
+
+class MultiRoomMain:
+    """Run pipelines of all configured rooms in one process, every room in its own thread.
+
+    Rooms share the async TV event loop, streaming sessions of the same bridge and the metrics
+    endpoint. Every room has its own TV connection, scheduler and mixer, so a slow or unreachable
+    TV delays only its own room.
+    """
+
+    def __init__(self, config_path: Union[str, Path] = "userconfig.yaml") -> None:
+        config_loader = ConfigLoader(config_path)
+        self._config_path = Path(config_path)
+        self._reload_config = config_loader.get_reload()
+        self.rooms = [AmbiHueMain(room=room) for room in config_loader.get_rooms()]
+        assert self.rooms, "No rooms configured"
+
+        metrics_config = config_loader.get_metrics()
+        self._metrics_server: Optional[MetricsServer] = None
+        if metrics_config.get("enabled", False):
+            self._metrics_server = MetricsServer(
+                {room.name: room.metrics for room in self.rooms},
+                metrics_config.get("port", 8080),
+                reload=self.reload_config,
+            )
+
+    def reload_config(self) -> None:
+        """Load the config file again and reload every room, see `AmbiHueMain.reload_config`."""
+        rooms = {
+            room.get_name(): room for room in ConfigLoader.from_file(self._config_path).get_rooms()
+        }
+        for app in self.rooms:  # nothing is applied when a room refuses its config
+            if app.name in rooms:
+                app.check_reload(rooms[app.name])
+        for app in self.rooms:
+            room = rooms.pop(app.name, None)
+            if room is None:
+                logger.warning(f"Room {app.name} removed from config, restart to apply")
+                continue
+            app.reload_config(room)
+        for name in rooms:
+            logger.warning(f"Room {name} added to config, restart to apply")
+
+    def run(self) -> None:
+        """Run all rooms until all of them stop. An error stops only the failing room."""
+        if self._metrics_server:
+            self._metrics_server.start()
+        watcher: Optional[ConfigWatcher] = None
+        if self._reload_config.get("watch", True):
+            watcher = ConfigWatcher(
+                self._config_path, self.reload_config, self._reload_config.get("interval_s", 1.0)
+            )
+            watcher.start()
+
+        threads: List[threading.Thread] = [
+            threading.Thread(target=self._run_room, args=(room,), name=room.name, daemon=True)
+            for room in self.rooms
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join(timeout=3)  # rooms stop their reader processes
+            if watcher:
+                watcher.stop()
+            if self._metrics_server:
+                self._metrics_server.stop()
+
+    @staticmethod
+    def _run_room(room: AmbiHueMain) -> None:
+        try:
+            room.run()
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            logger.error(f"Room {room.name} stopped: {err}")
 
-    def _exit(self, exit_code: int = 0) -> None:
-        """Exit the AmbiHue application."""
-        logger.warning(f"Exiting AmbiHue application {exit_code}.")
-        del self._hue
-        del self._tv
-        sys.exit(exit_code)
+    def stop(self) -> None:
+        for room in self.rooms:
+            room.stop()
 
 
 def verify_tv() -> None:
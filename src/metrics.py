@@ -0,0 +1,205 @@
+"""Hot loop instrumentation and `/metrics` HTTP endpoint.
+
+Every pipeline stage has a fixed-size histogram of its duration. Recording is a few integer
+operations, so it stays enabled in production. The endpoint serves Prometheus text format on
+`/metrics` and JSON on `/metrics.json`.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Deque, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds in seconds, the last bucket is +Inf
+BUCKETS_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+STAGES = ("fetch", "decode", "mix", "filter", "send", "frame")
+
+
+class Histogram:
+    """Fixed buckets histogram of durations in seconds."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_S) + 1)
+        self.sum_s = 0.0
+        self.count = 0
+
+    def observe(self, duration_s: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_S, duration_s)] += 1
+        self.sum_s += duration_s
+        self.count += 1
+
+    def observe_since(self, started: float) -> None:
+        """Observe time elapsed since `started` taken from time.perf_counter()."""
+        self.observe(time.perf_counter() - started)
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound of the bucket holding given percentile, inf when above all buckets."""
+        if self.count == 0:
+            return 0.0
+        threshold = self.count * percent / 100
+        total = 0
+        for bound, count in zip(BUCKETS_S, self.counts):
+            total += count
+            if total >= threshold:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Per-stage histograms, frame counters and gauges of the running pipeline."""
+
+    def __init__(self) -> None:
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.frames = 0
+        self._frame_times: Deque[float] = deque(maxlen=64)
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._started = time.monotonic()
+
+    def frame_done(self) -> None:
+        self.frames += 1
+        self._frame_times.append(time.monotonic())
+
+    def frame_rate(self) -> float:
+        """Frames per second over the last (up to) 64 frames."""
+        times = self._frame_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def gauge(self, name: str, getter: Callable[[], float]) -> None:
+        """Register value read on every scrape, e.g. error counters owned by other objects."""
+        self._gauges[name] = getter
+
+    def gauge_values(self) -> Dict[str, float]:
+        return {name: getter() for name, getter in self._gauges.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "uptime_s": time.monotonic() - self._started,
+            "frames": self.frames,
+            "frame_rate": self.frame_rate(),
+            **self.gauge_values(),
+            "stages": {
+                stage: {
+                    "count": hist.count,
+                    "avg_ms": hist.sum_s * 1000 / hist.count if hist.count else 0.0,
+                    "p50_ms": hist.percentile(50) * 1000,
+                    "p95_ms": hist.percentile(95) * 1000,
+                    "p99_ms": hist.percentile(99) * 1000,
+                }
+                for stage, hist in self.stages.items()
+            },
+        }
+
+    def prometheus(self) -> str:
+        return render_prometheus({"": self})
+
+
+def render_prometheus(metrics_by_room: Dict[str, Metrics]) -> str:
+    """Prometheus text format, samples of named rooms get a `room` label."""
+
+    def labels(room: str, **extra: str) -> str:
+        pairs = ([f'room="{room}"'] if room else []) + [f'{k}="{v}"' for k, v in extra.items()]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    rooms = metrics_by_room.items()
+    lines = ["# TYPE ambihue_frames_total counter"]
+    lines += [f"ambihue_frames_total{labels(room)} {metrics.frames}" for room, metrics in rooms]
+    lines.append("# TYPE ambihue_frame_rate gauge")
+    lines += [
+        f"ambihue_frame_rate{labels(room)} {metrics.frame_rate():.3f}" for room, metrics in rooms
+    ]
+
+    gauges = {room: metrics.gauge_values() for room, metrics in rooms}
+    for name in dict.fromkeys(name for values in gauges.values() for name in values):
+        lines.append(f"# TYPE ambihue_{name} gauge")
+        for room, values in gauges.items():
+            if name in values:
+                lines.append(f"ambihue_{name}{labels(room)} {values[name]}")
+
+    lines.append("# TYPE ambihue_stage_seconds histogram")
+    for room, metrics in rooms:
+        for stage, hist in metrics.stages.items():
+            total = 0
+            for bound, count in zip((*BUCKETS_S, "+Inf"), hist.counts):
+                total += count
+                bucket = labels(room, stage=stage, le=str(bound))
+                lines.append(f"ambihue_stage_seconds_bucket{bucket} {total}")
+            lines.append(f"ambihue_stage_seconds_sum{labels(room, stage=stage)} {hist.sum_s:.6f}")
+            lines.append(f"ambihue_stage_seconds_count{labels(room, stage=stage)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serve metrics over HTTP in a background thread.
+
+    With several rooms, `/metrics.json` is keyed by room name. `POST /reload` calls `reload`
+    (when given) to apply config file changes.
+    """
+
+    def __init__(
+        self,
+        metrics: Union[Metrics, Dict[str, Metrics]],
+        port: int = 8080,
+        host: str = "0.0.0.0",
+        reload: Optional[Callable[[], None]] = None,
+    ) -> None:
+        metrics_by_room = metrics if isinstance(metrics, dict) else {"": metrics}
+
+        def snapshot() -> Dict[str, Any]:
+            if list(metrics_by_room) == [""]:
+                return metrics_by_room[""].snapshot()
+            return {room: room_metrics.snapshot() for room, room_metrics in metrics_by_room.items()}
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                if self.path == "/metrics":
+                    body = render_prometheus(metrics_by_room).encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                if self.path != "/reload" or reload is None:
+                    self.send_error(404)
+                    return
+                try:
+                    reload()
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    logger.error(f"Reloading config failed, keeping current config: {err}")
+                    self.send_error(400, explain=str(err))
+                    return
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args: Any) -> None:
+                pass  # do not log every scrape
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Metrics available on port {self._server.server_address[1]}")
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,177 @@
+"""Building blocks for the pipelined TV -> Hue loop.
+
+The TV reader stage runs in its own thread and keeps the next HTTP request in flight while the
+previous frame is mixed and streamed. Stages exchange frames through a single-slot hand-off where
+the newest frame always wins, so a slow consumer never works on stale data.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Optional, Protocol, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class StopEvent(Protocol):
+    """threading.Event or multiprocessing.Event."""
+
+    def is_set(self) -> bool: ...
+
+    def wait(self, timeout: Optional[float] = None) -> bool: ...
+
+
+class LatestFrameSlot(Generic[T]):
+    """Bounded (single item) hand-off between two stages. The newest frame wins."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._item: Optional[T] = None
+        self.dropped = 0  # frames overwritten before the consumer took them
+
+    def put(self, item: T) -> None:
+        """Store the newest frame, dropping the previous one if it was not consumed."""
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify_all()
+
+    def take(self, timeout: Optional[float] = None) -> Optional[T]:
+        """Take the newest frame. Wait up to `timeout` seconds (None = do not wait)."""
+        with self._cond:
+            if self._item is None and timeout:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+
+class ProducerThread(threading.Thread, Generic[T]):
+    """Call `produce` in a loop and publish every non-None result to `slot`."""
+
+    def __init__(self, produce: Callable[[], Optional[T]], slot: LatestFrameSlot[T], name: str):
+        super().__init__(name=name, daemon=True)
+        self._produce = produce
+        self._slot = slot
+        self._stop_event = threading.Event()
+        self.error: Optional[BaseException] = None  # set when the producer died
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                item = self._produce()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                logger.error(f"[{self.name}] stage stopped: {err}")
+                self.error = err
+                return
+            if item is not None:
+                self._slot.put(item)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class FixedRateTimer:
+    """Deadline based ticker. Work time is compensated, missed ticks are skipped."""
+
+    def __init__(self, rate_hz: float) -> None:
+        assert rate_hz > 0, "Rate must be positive"
+        self._period = 1.0 / rate_hz
+        self._deadline = time.monotonic()
+
+    def wait(self) -> None:
+        """Sleep until the next tick."""
+        self._deadline += self._period
+        delay = self._deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self._deadline = time.monotonic()  # we are late, do not try to catch up
+
+
+class RestartBackoff:
+    """Restart delay of a crashed stage: 1 s, doubled after every next crash up to 30 s."""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._delay_s = 1.0
+        self._restart_at = 0.0
+
+    def due(self) -> bool:
+        """Call while the stage is down, True when it is time to restart it."""
+        now = time.monotonic()
+        if not self._restart_at:
+            logger.error(f"{self._name} stage stopped, restart in {self._delay_s:.0f}s")
+            self._restart_at = now + self._delay_s
+            self._delay_s = min(self._delay_s * 2, 30.0)
+            return False
+        if now < self._restart_at:
+            return False
+        self._restart_at = 0.0
+        return True
+
+    def reset(self) -> None:
+        """The stage works again."""
+        self._delay_s = 1.0
+
+
+class PollScheduler:
+    """Deadline based TV polling with idle rate and exponential backoff on errors.
+
+    - active: poll at `target_fps`, work time is compensated
+    - idle: frames have not changed for `idle_after_s`, poll at `idle_fps`; first change returns
+      to the active rate immediately
+    - error: wait `backoff_min_s`, doubled after every next error up to `backoff_max_s`
+    """
+
+    def __init__(self, config: Dict[str, Any], stop_event: Optional[StopEvent] = None):
+        self._active_period = 1.0 / float(config.get("target_fps", 50))
+        self._idle_period = 1.0 / float(config.get("idle_fps", 2))
+        self._idle_after_s = float(config.get("idle_after_s", 3.0))
+        self._backoff_min_s = float(config.get("backoff_min_s", 0.1))
+        self._backoff_max_s = float(config.get("backoff_max_s", 5.0))
+        self._stop_event: StopEvent = stop_event or threading.Event()
+
+        self.period = self._active_period
+        self._backoff_s = 0.0
+        self._deadline = time.monotonic()
+        self._last_change = self._deadline
+
+    @property
+    def is_idle(self) -> bool:
+        return self.period == self._idle_period
+
+    def wait(self) -> None:
+        """Sleep until the next poll deadline (or until stop event is set)."""
+        self._deadline += self.period
+        delay = self._deadline - time.monotonic()
+        if delay > 0:
+            self._stop_event.wait(delay)
+        else:
+            self._deadline = time.monotonic()  # we are late, do not try to catch up
+
+    def succeeded(self, changed: bool) -> None:
+        """Report a valid frame, `changed` = frame differs from the previous one."""
+        now = time.monotonic()
+        if self._backoff_s:
+            logger.warning("TV is responding again")
+            self._backoff_s = 0.0
+            self.period = self._active_period
+
+        if changed:
+            self._last_change = now
+            if self.period != self._active_period:
+                self.period = self._active_period
+                self._deadline = now - self.period  # ramp up instantly, next wait() returns
+        elif now - self._last_change > self._idle_after_s and not self.is_idle:
+            logger.info(f"No changes for {self._idle_after_s}s, polling at idle rate")
+            self.period = self._idle_period
+
+    def failed(self) -> None:
+        """Report TV error, back off exponentially."""
+        if not self._backoff_s:
+            logger.warning("TV is not responding, backing off")
+        self._backoff_s = min(self._backoff_max_s, max(self._backoff_min_s, 2 * self._backoff_s))
+        self.period = self._backoff_s
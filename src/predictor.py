@@ -0,0 +1,181 @@
+"""Latency estimation and short-horizon color prediction.
+
+A TV frame is already old when it reaches the lights: the TV renders it, the HTTP response
+travels back, the frame is mixed and the bridge applies the new color. Every TV frame carries the
+time its request was sent and its response was received. Half of the round trip is taken as the
+TV-side latency (EMA over recent requests). The frame age when the light shows it is
+
+    horizon = TV latency + (now - response received) + bridge latency
+
+The optional predictor extrapolates every light color by this horizon from recent samples, which
+hides most of the delay on smooth changes (fades, pans). Hard cuts reset the extrapolation, so
+a cut never overshoots.
+"""
+
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.light_map import light_overrides
+
+logger = logging.getLogger(__name__)
+
+RGB = Tuple[int, int, int]
+
+_DEFAULTS: Dict[str, Any] = {
+    "mode": "none",  # "none", "linear" or "kalman"
+    "gain": 1.0,  # fraction of the horizon to extrapolate, lower = safer
+    "max_horizon_s": 0.15,  # never extrapolate further than this
+    "cut_threshold": 96.0,  # color distance treated as a hard cut, speed is reset
+    "process_noise": 2000.0,  # kalman: acceleration variance, higher = follows changes faster
+    "measurement_noise": 4.0,  # kalman: variance of the TV colors
+}
+
+
+class LatencyEstimator:
+    """Online estimate of the TV latency and of the age of frames when lights show them."""
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        """Args:
+        config: "bridge_latency_s" time the bridge needs to apply a color,
+            "latency_alpha" EMA weight of the newest round trip
+        """
+        self._bridge_latency_s = float(config.get("bridge_latency_s", 0.04))
+        self._alpha = float(config.get("latency_alpha", 0.1))
+        assert 0 < self._alpha <= 1, "latency_alpha must be in range (0, 1]"
+        self.tv_latency_s = 0.0
+        self.horizon_s = 0.0  # last computed horizon, for metrics
+
+    def observe(self, sent_at: float, received_at: float) -> None:
+        """Update TV latency with request send and response receipt times (time.monotonic)."""
+        latency = max(0.0, received_at - sent_at) / 2
+        if self.tv_latency_s:
+            self.tv_latency_s += self._alpha * (latency - self.tv_latency_s)
+        else:
+            self.tv_latency_s = latency
+
+    def captured_at(self, received_at: float) -> float:
+        """Estimated time the TV rendered a frame received at `received_at`."""
+        return received_at - self.tv_latency_s
+
+    def horizon(self, captured_at: float, now: float) -> float:
+        """Age of a frame captured at `captured_at` when the bridge shows its colors."""
+        self.horizon_s = now - captured_at + self._bridge_latency_s
+        return self.horizon_s
+
+
+class LightPredictor:
+    """Extrapolation of a single light color, every channel has its own speed estimate."""
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        config = {**_DEFAULTS, **config}
+        assert config["mode"] in ("none", "linear", "kalman"), f"Unknown predictor: {config}"
+        assert 0 <= config["gain"] <= 1, "gain must be in range [0, 1]"
+        self.mode = config["mode"]
+        self._gain = float(config["gain"])
+        self._max_horizon_s = float(config["max_horizon_s"])
+        self._cut_threshold = float(config["cut_threshold"])
+        self._process_noise = float(config["process_noise"])
+        self._measurement_noise = float(config["measurement_noise"])
+
+        self._timestamp: Optional[float] = None
+        self._value = [0.0, 0.0, 0.0]
+        self._speed = [0.0, 0.0, 0.0]  # color units per second
+        # kalman: covariance [[p00, p01], [p01, p11]] of (value, speed) per channel
+        self._cov = [[0.0, 0.0, 0.0] for _ in range(3)]
+
+    def _reset(self, color: RGB, timestamp: float) -> None:
+        self._timestamp = timestamp
+        self._value = [float(channel) for channel in color]
+        self._speed = [0.0, 0.0, 0.0]
+        self._cov = [[self._measurement_noise, 0.0, 1e4] for _ in range(3)]  # speed is unknown
+
+    def _linear(self, color: RGB, d_time: float) -> None:
+        for idx, channel in enumerate(color):
+            self._speed[idx] = (channel - self._value[idx]) / d_time
+            self._value[idx] = float(channel)
+
+    def _kalman(self, color: RGB, d_time: float) -> None:
+        """Constant speed model, https://en.wikipedia.org/wiki/Kalman_filter#Example_application"""
+        noise = self._process_noise
+        q00, q01, q11 = noise * d_time**4 / 4, noise * d_time**3 / 2, noise * d_time**2
+        for idx, channel in enumerate(color):
+            p00, p01, p11 = self._cov[idx]
+            # predict
+            value = self._value[idx] + self._speed[idx] * d_time
+            p00 += 2 * d_time * p01 + d_time**2 * p11 + q00
+            p01 += d_time * p11 + q01
+            p11 += q11
+            # update with the measured color
+            gain_v = p00 / (p00 + self._measurement_noise)
+            gain_s = p01 / (p00 + self._measurement_noise)
+            residual = channel - value
+            self._value[idx] = value + gain_v * residual
+            self._speed[idx] += gain_s * residual
+            self._cov[idx] = [(1 - gain_v) * p00, (1 - gain_v) * p01, p11 - gain_s * p01]
+
+    def update(self, color: RGB, timestamp: float, horizon_s: float) -> RGB:
+        """Add sample captured at `timestamp`, return color expected `horizon_s` later."""
+        if self.mode == "none":
+            return color
+
+        prev = self._timestamp
+        if prev is None or timestamp <= prev:
+            self._reset(color, timestamp)
+            return color
+        if math.dist(color, self._value) >= self._cut_threshold:
+            self._reset(color, timestamp)  # hard cut, previous speed is meaningless
+            return color
+
+        if self.mode == "linear":
+            self._linear(color, timestamp - prev)
+        else:
+            self._kalman(color, timestamp - prev)
+        self._timestamp = timestamp
+
+        ahead = self._gain * min(max(0.0, horizon_s), self._max_horizon_s)
+        value, speed = self._value, self._speed
+        return (
+            min(255, max(0, round(value[0] + speed[0] * ahead))),
+            min(255, max(0, round(value[1] + speed[1] * ahead))),
+            min(255, max(0, round(value[2] + speed[2] * ahead))),
+        )
+
+
+class ColorPredictor:
+    """Prediction stage for all lights, between ColorMixer and ColorFilter.
+
+    Config example:
+        predict:
+          mode: "linear"
+          bridge_latency_s: 0.04
+          lights:  # optional per light overrides, by light name
+            sofa_behind:
+              mode: "kalman"
+              gain: 0.5
+    """
+
+    def __init__(self, light_names: List[str], config: Dict[str, Any]) -> None:
+        overrides = config.get("lights") or {}
+        defaults = {
+            key: value
+            for key, value in config.items()
+            if key not in ("lights", "bridge_latency_s", "latency_alpha")
+        }
+        self._predictors = [
+            LightPredictor({**defaults, **light_overrides(name, overrides)}) for name in light_names
+        ]
+        self._predicted: List[RGB] = [(0, 0, 0)] * len(light_names)  # reused every frame
+        # False when no light is predicted, the stage can be skipped
+        self.enabled = any(light.mode != "none" for light in self._predictors)
+
+    def update(self, colors: List[RGB], timestamp: float, horizon_s: float) -> List[RGB]:
+        """Predict colors of all lights from colors of a frame captured at `timestamp`.
+
+        The returned list is reused for the next frame.
+        """
+        predicted = self._predicted
+        predictors = self._predictors
+        for idx in range(len(predictors)):  # pylint: disable=consider-using-enumerate
+            predicted[idx] = predictors[idx].update(colors[idx], timestamp, horizon_s)
+        return predicted
@@ -0,0 +1,170 @@
+"""Record decoded Ambilight frames to a compact binary file and replay them.
+
+File layout (little endian, append-only):
+    header: magic "AHRC" | version (uint8) | flags (uint8) | left, top, right LED counts (uint16)
+    raw file: records one after another
+    zstd file (flag 1): blocks of `compressed size (uint32) | records (uint32) | zstd data`
+    record: milliseconds since the first frame (uint32) | r, g, b bytes of every LED
+
+Records have a fixed size, so a raw file is memory-mapped and every frame is a zero-copy view.
+Only frames that differ from the previous one reach the recorder, an hour of 17 LEDs at 50 frames
+per second is at most ~10 MB raw.
+"""
+
+import logging
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, BinaryIO, Generator, Iterator, List, Optional, Tuple, Union
+
+try:
+    import zstandard  # type: ignore[import-not-found,unused-ignore]  # optional, smaller files
+
+    _ZSTD_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AHRC"
+VERSION = 1
+FLAG_ZSTD = 1
+
+_HEADER = struct.Struct("<4sBBHHH")
+_BLOCK = struct.Struct("<II")
+_TIMESTAMP = struct.Struct("<I")
+
+
+class RecordingWriter:
+    """Append frames to a recording. The file is created with the first frame."""
+
+    def __init__(
+        self, path: Union[str, Path], compress: bool = False, block_frames: int = 256
+    ) -> None:
+        if compress and not _ZSTD_AVAILABLE:
+            logger.warning("zstandard is not installed, recording without compression")
+            compress = False
+        self._path = Path(path)
+        self._compress = compress
+        self._block_frames = block_frames
+        self._file: Optional[BinaryIO] = None
+        self._layout: Tuple[int, int, int] = (0, 0, 0)
+        self._started = 0.0
+        self._block = bytearray()
+        self._block_cnt = 0
+        self.frames_cnt = 0
+
+    def write(self, rgb: Any, layout: Tuple[int, int, int], timestamp: float) -> None:
+        """Append one frame, `timestamp` in seconds from time.monotonic()."""
+        if self._file is None:
+            self._open(layout, timestamp)
+        elif layout != self._layout:
+            logger.warning(f"TV layout changed {self._layout} -> {layout}, frame not recorded")
+            return
+
+        offset_ms = min(int((timestamp - self._started) * 1000), 0xFFFFFFFF)
+        if self._compress:
+            self._block += _TIMESTAMP.pack(offset_ms)
+            self._block += rgb
+            self._block_cnt += 1
+            if self._block_cnt >= self._block_frames:
+                self._flush_block()
+        else:
+            assert self._file is not None
+            self._file.write(_TIMESTAMP.pack(offset_ms))
+            self._file.write(rgb)
+        self.frames_cnt += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._flush_block()
+        self._file.close()
+        self._file = None
+        logger.warning(f"Recorded {self.frames_cnt} frames to {self._path}")
+
+    def _open(self, layout: Tuple[int, int, int], timestamp: float) -> None:
+        self._layout = layout
+        self._started = timestamp
+        self._file = open(self._path, "wb")  # pylint: disable=consider-using-with
+        flags = FLAG_ZSTD if self._compress else 0
+        self._file.write(_HEADER.pack(MAGIC, VERSION, flags, *layout))
+        logger.info(f"Recording {layout} LEDs to {self._path}")
+
+    def _flush_block(self) -> None:
+        if not self._block_cnt:
+            return
+        assert self._file is not None
+        data = zstandard.ZstdCompressor().compress(bytes(self._block))
+        self._file.write(_BLOCK.pack(len(data), self._block_cnt))
+        self._file.write(data)
+        self._file.flush()
+        self._block.clear()
+        self._block_cnt = 0
+
+
+class RecordingReader:
+    """Read a recording. Raw files are memory-mapped, frames are views into the mapping."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        with open(path, "rb") as file:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"{path} is not an AmbiHue recording")
+            magic, version, flags, left, top, right = _HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not an AmbiHue recording (version {VERSION})")
+            if flags & FLAG_ZSTD and not _ZSTD_AVAILABLE:
+                raise ValueError(f"{path} is compressed, install zstandard to replay it")
+
+            self.layout: Tuple[int, int, int] = (left, top, right)
+            self.compressed = bool(flags & FLAG_ZSTD)
+            self.record_size = _TIMESTAMP.size + 3 * (left + top + right)
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._iterators: List[Generator[Tuple[float, memoryview], None, None]] = []
+
+    def __enter__(self) -> "RecordingReader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def frames(self) -> Iterator[Tuple[float, memoryview]]:
+        """Yield (seconds since the first frame, r/g/b bytes of all LEDs).
+
+        A frame view is valid only until the next frame is requested.
+        """
+        iterator = self._frames()
+        self._iterators.append(iterator)
+        return iterator
+
+    def _frames(self) -> Generator[Tuple[float, memoryview], None, None]:
+        blocks = self._blocks() if self.compressed else iter([self._view[_HEADER.size :]])
+        size = self.record_size
+        for block in blocks:
+            with block:
+                for offset in range(0, len(block) - size + 1, size):  # cut-off record is skipped
+                    (offset_ms,) = _TIMESTAMP.unpack_from(block, offset)
+                    with block[offset + _TIMESTAMP.size : offset + size] as rgb:
+                        yield offset_ms / 1000, rgb
+
+    def _blocks(self) -> Iterator[memoryview]:
+        decompressor = zstandard.ZstdDecompressor()
+        offset = _HEADER.size
+        while offset + _BLOCK.size <= len(self._view):
+            data_size, records = _BLOCK.unpack_from(self._view, offset)
+            offset += _BLOCK.size
+            if offset + data_size > len(self._view):
+                break  # block cut off by a crash
+            data = decompressor.decompress(
+                self._view[offset : offset + data_size], max_output_size=records * self.record_size
+            )
+            offset += data_size
+            yield memoryview(data)
+
+    def close(self) -> None:
+        for iterator in self._iterators:
+            iterator.close()  # release views of unfinished iterations
+        self._view.release()
+        self._mmap.close()
@@ -0,0 +1,169 @@
+"""Decode `ambilight/processed` payloads straight into a flat RGB buffer.
+
+Buffer layout is the same as in ColorMixer: left side, top side, right side in reversed order.
+Every LED takes 3 bytes (r, g, b).
+
+Payload may be the whole document (`ambilight/processed`), a single layer
+(`ambilight/processed/layer1`) or a single side (`ambilight/processed/layer1/left`). With
+`set_sides` only the sides used by lights are parsed, LEDs of other sides keep their last values.
+
+Backends:
+- "scan" - regex scan of raw bytes, no intermediate dicts or Color objects
+- "orjson" - orjson parser (optional dependency), dicts are read directly into the buffer
+- "json" - standard library parser, same as "orjson" but slower
+- "auto" - "orjson" when installed, otherwise "json" (CPython json is faster than the regex scan)
+"""
+
+import json
+import logging
+import re
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from orjson import loads as orjson_loads  # type: ignore[import-not-found,unused-ignore]
+
+    _ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover
+    _ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SIDES = ("left", "top", "right")
+
+# {"r": 1, "g": 2, "b": 3} in any key order -> (b"1", b"2", b"3")
+_LED_RE = re.compile(
+    rb'\{(?=[^{}]*"r"\s*:\s*(\d+))(?=[^{}]*"g"\s*:\s*(\d+))(?=[^{}]*"b"\s*:\s*(\d+))[^{}]*\}'
+)
+
+
+def _side_re(side: str) -> "re.Pattern[bytes]":
+    # "left": {"0": {"r": 1, "g": 2, "b": 3}, "1": {...}}
+    return re.compile(rb'"' + side.encode() + rb'"\s*:\s*\{([^{}]*(?:\{[^{}]*\}[^{}]*)*)\}')
+
+
+_SIDE_RES = {side: _side_re(side) for side in SIDES}
+
+
+class AmbilightDecoder:
+    """Decode TV payloads into one preallocated `array("B")`, reused for every frame."""
+
+    def __init__(self, layer: str = "layer1", backend: str = "auto") -> None:
+        self.layer = layer
+        self._layer_key = f'"{layer}"'.encode()
+
+        if backend == "auto":
+            backend = "orjson" if _ORJSON_AVAILABLE else "json"
+        if backend == "orjson" and not _ORJSON_AVAILABLE:
+            logger.warning("orjson is not installed, using json decoder")
+            backend = "json"
+
+        decoders: Dict[str, Callable[[bytes], List[Optional[List[int]]]]] = {
+            "scan": self._scan_sides,
+            "orjson": lambda raw: self._dict_sides(orjson_loads(raw)),
+            "json": lambda raw: self._dict_sides(json.loads(raw)),
+        }
+        assert backend in decoders, f"Unknown decoder backend: {backend}"
+        self.backend = backend
+        self._decode_sides = decoders[backend]
+
+        self.buffer = array("B")
+        self.layout: Tuple[int, int, int] = (0, 0, 0)  # number of LEDs: left, top, right
+        self.sides: Tuple[str, ...] = SIDES  # sides parsed from payloads
+
+    def set_sides(self, sides: Sequence[str]) -> None:
+        """Parse only `sides`, the layout of other sides must be known from a previous frame."""
+        assert sides, "At least one side is needed"
+        assert set(sides) <= set(SIDES), f"Unknown sides: {sides}"
+        assert set(sides) == set(SIDES) or sum(self.layout) > 0, "Layout is not known yet"
+        self.sides = tuple(side for side in SIDES if side in sides)
+
+    def decode(self, raw: bytes) -> "array[int]":
+        """Decode raw response into `self.buffer` and return it.
+
+        Raises:
+            ValueError: payload is not valid ambilight data
+        """
+        left, top, right = self._decode_sides(raw)
+        try:
+            self._fill(left, top, right)
+        except OverflowError as err:
+            raise ValueError(f"Color value out of range: {err}") from err
+        return self.buffer
+
+    def decode_dict(self, data: Dict[str, Any]) -> "array[int]":
+        """Decode already parsed JSON data into `self.buffer` and return it."""
+        left, top, right = self._dict_sides(data)
+        self._fill(left, top, right)
+        return self.buffer
+
+    def _fill(
+        self, left: Optional[List[int]], top: Optional[List[int]], right: Optional[List[int]]
+    ) -> None:
+        """Write r, g, b values of every side, None = side not parsed, keep its LEDs."""
+        known = self.layout
+        layout = (
+            len(left) // 3 if left is not None else known[0],
+            len(top) // 3 if top is not None else known[1],
+            len(right) // 3 if right is not None else known[2],
+        )
+        if layout != self.layout:  # (re)allocate only when the TV layout changes
+            logger.info(f"Ambilight layout (left, top, right): {layout}")
+            self.layout = layout
+            self.buffer = array("B", bytes(3 * sum(layout)))
+
+        buf = self.buffer
+        offset = 3 * layout[0]
+        if left is not None:
+            buf[:offset] = array("B", left)
+        if top is not None:
+            buf[offset : offset + len(top)] = array("B", top)
+        offset += 3 * layout[1]
+
+        if right is not None:
+            # invert RIGHT order! keep r, g, b order inside every LED
+            rev = right[::-1]
+            buf[offset::3] = array("B", rev[2::3])
+            buf[offset + 1 :: 3] = array("B", rev[1::3])
+            buf[offset + 2 :: 3] = array("B", rev[0::3])
+
+    def _single_side_payload(self, has_side_keys: bool) -> bool:
+        """Payload of `ambilight/processed/<layer>/<side>`: LEDs without a side key."""
+        return len(self.sides) == 1 and not has_side_keys
+
+    def _scan_sides(self, raw: bytes) -> List[Optional[List[int]]]:
+        start = max(0, raw.find(self._layer_key))  # not found: layer or side payload
+
+        sides: List[Optional[List[int]]] = []
+        for side in SIDES:
+            if side not in self.sides:
+                sides.append(None)
+                continue
+            match = _SIDE_RES[side].search(raw, start)
+            if match is not None:
+                content = match.group(1)
+            elif self._single_side_payload(any(f'"{key}"'.encode() in raw for key in SIDES)):
+                content = raw
+            else:
+                raise ValueError(f"{self.layer}/{side} not found in TV data")
+            sides.append([int(value) for led in _LED_RE.findall(content) for value in led])
+        return sides
+
+    def _dict_sides(self, data: Any) -> List[Optional[List[int]]]:
+        try:
+            layer = data.get(self.layer, data)  # whole document or layer/side payload
+            single = self._single_side_payload(any(key in layer for key in SIDES))
+            return [
+                (
+                    [
+                        value
+                        for led in (layer if single else layer[side]).values()
+                        for value in (led["r"], led["g"], led["b"])
+                    ]
+                    if side in self.sides
+                    else None
+                )
+                for side in SIDES
+            ]
+        except (KeyError, TypeError, AttributeError) as err:
+            raise ValueError(f"Unexpected TV data: {err}") from err
@@ -0,0 +1,259 @@
+"""TV reader process for `pipeline: mode: "multiprocess"`.
+
+The reader process polls the TV, decodes every response and writes the flat r/g/b buffer to a
+ring of fixed-size records in shared memory. The main process mixes, filters and streams to Hue at
+a fixed rate. Both processes have their own GIL, so HTTP, JSON decoding and logging in one of
+them never delay the other.
+
+Shared memory layout (little endian):
+    header: write sequence, TV errors in a row, TV reconnects, reader errors (uint64)
+    record: begin sequence (uint64) | sent_at, received_at (float64) | left, top, right LEDs,
+        changed flag (uint16) | r/g/b bytes of up to `max_leds` LEDs | end sequence (uint64)
+
+The writer stores the begin sequence first and the end sequence last; the reader takes the end
+sequence before and the begin sequence after copying a record. A record overwritten meanwhile has
+different sequences and is skipped, the next tick reads a newer one. Timestamps are
+time.monotonic(), which is the same clock in all processes.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+from array import array
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+
+from src.ah_logger import init_logger
+from src.ambilight_tv import create_ambilight_tv
+from src.pipeline import PollScheduler, StopEvent
+from src.tv_decoder import AmbilightDecoder
+
+logger = logging.getLogger(__name__)
+
+Layout = Tuple[int, int, int]
+
+_HEADER = struct.Struct("<QQQQ")
+_RECORD = struct.Struct("<QddHHHH")
+_SEQ = struct.Struct("<Q")
+
+
+class RingFrame(NamedTuple):
+    """Decoded frame read from the ring, `rgb` is reused by the next read."""
+
+    rgb: memoryview
+    layout: Layout
+    sent_at: float
+    received_at: float
+    changed: bool  # False = TV response was byte-identical to the previous one
+
+
+class FrameRing:
+    """Single writer, single reader ring of decoded frames in shared memory. Newest wins."""
+
+    def __init__(self, max_leds: int, slots: int = 4, name: Optional[str] = None) -> None:
+        """Create the shared memory (`name` None) or attach to the one of the other process."""
+        assert max_leds > 0 and slots > 1, "Ring needs LEDs and at least 2 slots"
+        self._slots = slots
+        self._rgb_size = 3 * max_leds
+        self._record_size = _RECORD.size + self._rgb_size + _SEQ.size
+        size = _HEADER.size + slots * self._record_size
+        self._shm = SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self._owner = name is None
+        self.name = self._shm.name
+        buf = self._shm.buf
+        assert buf is not None
+        self._buf: Optional[memoryview] = buf
+
+        # a restarted writer continues the sequence of the previous one
+        self._write_seq = 0 if self._owner else _SEQ.unpack_from(buf, 0)[0]
+        self._read_seq = 0
+        self._rgb = bytearray(self._rgb_size)  # reader copy, reused for every frame
+        self._rgb_view = memoryview(self._rgb)
+        self.dropped = 0  # records overwritten before the reader took them
+
+    def _offset(self, seq: int) -> int:
+        return _HEADER.size + (seq % self._slots) * self._record_size
+
+    def write(
+        self,
+        rgb: Union["array[int]", memoryview],
+        layout: Layout,
+        sent_at: float,
+        received_at: float,
+        changed: bool,
+    ) -> bool:
+        """Publish a decoded frame, False when it has more LEDs than the records hold."""
+        buf = self._buf
+        assert buf is not None, "Ring is closed"
+        size = len(rgb)
+        if size > self._rgb_size:
+            return False
+        seq = self._write_seq + 1
+        offset = self._offset(seq)
+        _RECORD.pack_into(buf, offset, seq, sent_at, received_at, *layout, changed)
+        start = offset + _RECORD.size
+        buf[start : start + size] = rgb
+        _SEQ.pack_into(buf, offset + self._record_size - _SEQ.size, seq)
+        _SEQ.pack_into(buf, 0, seq)
+        self._write_seq = seq
+        return True
+
+    def read(self) -> Optional[RingFrame]:
+        """Newest frame not read yet, None when there is none."""
+        buf = self._buf
+        assert buf is not None, "Ring is closed"
+        seq = _SEQ.unpack_from(buf, 0)[0]
+        if seq == self._read_seq:
+            return None
+        offset = self._offset(seq)
+        end_seq = _SEQ.unpack_from(buf, offset + self._record_size - _SEQ.size)[0]
+        _, sent_at, received_at, left, top, right, changed = _RECORD.unpack_from(buf, offset)
+        size = 3 * (left + top + right)
+        start = offset + _RECORD.size
+        self._rgb_view[:size] = buf[start : start + size]
+        if not end_seq == _SEQ.unpack_from(buf, offset)[0] == seq:
+            return None  # overwritten while copying
+
+        if self._read_seq:
+            self.dropped += seq - self._read_seq - 1
+        self._read_seq = seq
+        return RingFrame(
+            self._rgb_view[:size], (left, top, right), sent_at, received_at, bool(changed)
+        )
+
+    def set_stats(self, errors_in_row: int, reconnects: int, reader_errors: int) -> None:
+        assert self._buf is not None, "Ring is closed"
+        _HEADER.pack_into(self._buf, 0, self._write_seq, errors_in_row, reconnects, reader_errors)
+
+    def stats(self) -> Tuple[int, int, int]:
+        """TV errors in a row, TV reconnects and decoding errors of the writer."""
+        assert self._buf is not None, "Ring is closed"
+        _, errors_in_row, reconnects, reader_errors = _HEADER.unpack_from(self._buf, 0)
+        return errors_in_row, reconnects, reader_errors
+
+    def close(self) -> None:
+        """Detach, the creating side also removes the shared memory."""
+        if self._buf is None:
+            return
+        self._buf.release()
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _read_tv(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    tv_config: Dict[str, Any],
+    pipeline_config: Dict[str, Any],
+    ring_name: str,
+    max_leds: int,
+    slots: int,
+    stop_event: StopEvent,
+    loglevel: int,
+) -> None:
+    """Entry point of the reader process: poll, decode and publish frames until stopped."""
+    # Ctrl+C reaches the whole process group, the main process stops this one (see ambihue.py)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if not logging.getLogger().handlers:
+        init_logger(logging.getLevelName(loglevel))
+
+    ring = FrameRing(max_leds, slots, ring_name)
+    tv = create_ambilight_tv(tv_config)
+    decoder = AmbilightDecoder(backend=tv_config.get("decoder", "auto"))
+    scheduler = PollScheduler(pipeline_config, stop_event)
+    tv.set_scheduler(scheduler)
+    parent_pid = os.getppid()
+    errors_in_row = reader_errors = 0
+    last_data = b""
+    try:
+        try:
+            tv.wait_for_startup()
+        except RuntimeError as err:
+            logger.warning(f"{err}, polling until the TV is back")
+
+        while not stop_event.is_set() and os.getppid() == parent_pid:
+            scheduler.wait()
+            if stop_event.is_set():
+                break
+            try:
+                tv_frame = tv.get_ambilight_frame()
+            except RuntimeError as err:
+                errors_in_row += 1
+                scheduler.failed()
+                ring.set_stats(errors_in_row, tv.reconnect_cnt, reader_errors)
+                logger.error(f"Request error: {err}")
+                continue
+
+            errors_in_row = 0
+            changed = tv_frame.data != last_data
+            scheduler.succeeded(changed)
+            if changed:
+                try:
+                    decoder.decode(tv_frame.data)
+                except ValueError as err:
+                    reader_errors += 1
+                    ring.set_stats(errors_in_row, tv.reconnect_cnt, reader_errors)
+                    logger.error(f"Decoding JSON error: {err}")
+                    continue
+                last_data = tv_frame.data
+            ring.set_stats(errors_in_row, tv.reconnect_cnt, reader_errors)
+            published = ring.write(
+                decoder.buffer, decoder.layout, tv_frame.sent_at, tv_frame.received_at, changed
+            )
+            if not published and changed:
+                logger.error(f"TV has {sum(decoder.layout)} LEDs, raise pipeline max_leds")
+    finally:
+        tv.close()
+        ring.close()
+
+
+class TvReaderProcess:
+    """Reader process with its frame ring, owned by the main process."""
+
+    def __init__(self, tv_config: Dict[str, Any], pipeline_config: Dict[str, Any]) -> None:
+        self._tv_config = tv_config
+        self._pipeline_config = pipeline_config
+        self._max_leds = int(pipeline_config.get("max_leds", 256))
+        self._slots = int(pipeline_config.get("ring_slots", 4))
+        self.ring = FrameRing(self._max_leds, self._slots)
+        # spawn: the reader does not inherit threads and locks of hue_entertainment_pykit
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._process: Optional[Any] = None
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._process = self._context.Process(
+            target=_read_tv,
+            args=(
+                self._tv_config,
+                self._pipeline_config,
+                self.ring.name,
+                self._max_leds,
+                self._slots,
+                self._stop_event,
+                logging.getLogger().getEffectiveLevel(),
+            ),
+            name="tv_reader",
+            daemon=True,  # never outlives the main process
+        )
+        self._process.start()
+        logger.info(f"TV reader process {self._process.pid} started")
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def stop(self, timeout_s: float = 2.0) -> None:
+        """Stop the reader process and remove the shared memory."""
+        self._stop_event.set()
+        if self._process is not None:
+            self._process.join(timeout_s)
+            if self._process.is_alive():
+                logger.warning("TV reader process did not stop, terminating it")
+                self._process.terminate()
+                self._process.join(timeout_s)
+            self._process = None
+        self.ring.close()
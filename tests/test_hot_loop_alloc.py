@@ -0,0 +1,97 @@
+"""Allocation regression test of the frame loop.
+
+A recording is replayed to a sink which resets the tracemalloc peak with every color it gets. The
+light changes with every frame, so each peak is the memory one frame allocated on top of what was
+in use before it: buffers created per frame instead of reused show up here even when they are
+freed again.
+"""
+
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import pytest
+import yaml
+
+from src.benchmark import FakeHueSink, generate_frames
+from src.config_loader import ConfigLoader
+from src.hue_entertainment import HueEntertainmentGroupKit
+from src.main import AmbiHueMain
+from src.recording import RecordingWriter
+from src.tv_decoder import AmbilightDecoder
+
+WARMUP_FRAMES = 100  # caches, histograms and filter state are filled
+MEASURED_FRAMES = 1000
+MAX_FRAME_BYTES = 8 * 1024  # temporaries of a single frame, numpy mixing needs ~4 KiB
+MAX_GROWTH_BYTES = 16 * 1024  # fixed overhead only, independent of the number of frames
+
+_CONFIG: Dict[str, Any] = {
+    "ambilight_tv": {"ip": "127.0.0.1"},
+    "hue_entertainment_group": {"_name": "allocation test sink", "index": 0},
+    "lights_setup": {"A_name": "all", "A_id": 0, "A_positions": list(range(17))},
+    "reload": {"watch": False},
+}
+
+
+class _PeakSink(FakeHueSink):
+    """Store nothing, track the highest memory allocated between two colors."""
+
+    def __init__(self, config: Dict[str, Any]) -> None:
+        super().__init__(config)
+        self.max_frame_bytes = 0
+        self.colors_cnt = 0
+        self._frame_start = 0
+
+    def set_color(self, light_id: int, color: Tuple[float, float, float]) -> None:
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self.colors_cnt:  # the first peak started before the replay
+                self.max_frame_bytes = max(self.max_frame_bytes, peak - self._frame_start)
+            tracemalloc.reset_peak()
+            self._frame_start = current
+            self.colors_cnt += 1
+
+
+class _PeakSinkMain(AmbiHueMain):
+    sink: _PeakSink
+
+    def _create_hue(self, config: Dict[str, Any]) -> HueEntertainmentGroupKit:
+        self.sink = _PeakSink(config)
+        return self.sink
+
+
+@pytest.fixture(name="app")
+def _app(tmp_path: Path) -> _PeakSinkMain:
+    config_path = tmp_path / "userconfig.yaml"
+    config_path.write_text(yaml.dump(_CONFIG), encoding="utf-8")
+    ConfigLoader.reset()
+    return _PeakSinkMain(config_path)
+
+
+def _record(path: Path, count: int) -> Path:
+    decoder = AmbilightDecoder()
+    writer = RecordingWriter(path)
+    for idx, payload in enumerate(generate_frames(count)):
+        writer.write(decoder.decode(payload), decoder.layout, idx / 50)
+    writer.close()
+    return path
+
+
+def test_frame_loop_allocations_are_bounded(app: _PeakSinkMain, tmp_path: Path) -> None:
+    warmup = _record(tmp_path / "warmup.ahrc", WARMUP_FRAMES)
+    measured = _record(tmp_path / "measured.ahrc", MEASURED_FRAMES)
+    app.replay(warmup, speed=0)
+
+    sink = app.sink
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        app.replay(measured, speed=0)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert sink.colors_cnt > MEASURED_FRAMES * 0.9, "the light must change with almost every frame"
+    assert sink.max_frame_bytes < MAX_FRAME_BYTES, f"a frame allocated {sink.max_frame_bytes} bytes"
+    growth = after - before
+    assert growth < MAX_GROWTH_BYTES, f"{growth} bytes kept after {MEASURED_FRAMES} frames"